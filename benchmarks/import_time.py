@@ -0,0 +1,49 @@
+"""
+Measures how long ``import pyramid_deform`` takes in a fresh interpreter
+which has already imported the Pyramid modules it depends on (as any
+Pyramid application has), and fails if it exceeds a budget or imports
+Colander, Deform or pkg_resources.  Run with::
+
+  python benchmarks/import_time.py [budget in milliseconds, default 30]
+"""
+import subprocess
+import sys
+
+SCRIPT = """
+import sys, time
+import pyramid.exceptions, pyramid.httpexceptions, pyramid.i18n
+import pyramid.settings, pyramid.threadlocal, pyramid.util
+preloaded = set(sys.modules)
+start = time.perf_counter()
+import pyramid_deform
+elapsed = time.perf_counter() - start
+heavy = [name for name in ('colander', 'deform', 'pkg_resources')
+         if name in sys.modules and name not in preloaded]
+print('%f %s' % (elapsed, ','.join(heavy)))
+"""
+
+
+def measure(repeat=5):
+    best = None
+    for num in range(repeat):
+        output = subprocess.check_output([sys.executable, '-c', SCRIPT])
+        elapsed, heavy = (output.decode('ascii').split() + [''])[:2]
+        elapsed = float(elapsed)
+        if best is None or elapsed < best[0]:
+            best = (elapsed, heavy)
+    return best
+
+
+def main():
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else 30.0
+    elapsed, heavy = measure()
+    print('import pyramid_deform: %.1f ms (budget %.1f ms)' % (
+        elapsed * 1e3, budget))
+    if heavy:
+        print('eagerly imported: %s' % heavy)
+    if heavy or elapsed * 1e3 > budget:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
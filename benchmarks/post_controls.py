@@ -0,0 +1,59 @@
+"""
+Peak memory allocated validating a bulk-edit form posting 10k and 100k
+controls (a sequence of mappings), with the controls copied into a list
+first, as ``request.POST.items()`` does on Python 2, and with
+``iter_controls``.  Run with::
+
+  python benchmarks/post_controls.py
+"""
+import tracemalloc
+
+import colander
+import deform
+from webob.multidict import MultiDict
+
+from pyramid_deform import iter_controls
+
+
+class Row(colander.MappingSchema):
+    name = colander.SchemaNode(colander.String())
+    value = colander.SchemaNode(colander.String())
+
+
+class Rows(colander.SequenceSchema):
+    row = Row()
+
+
+class Schema(colander.MappingSchema):
+    rows = Rows()
+
+
+def make_post(controls):
+    items = [('__start__', 'rows:sequence')]
+    for num in range((controls - 2) // 4):
+        items.extend([('__start__', 'row:mapping'), ('name', 'name%s' % num),
+                      ('value', 'value%s' % num), ('__end__', 'row:mapping')])
+    items.append(('__end__', 'rows:sequence'))
+    return MultiDict(items)
+
+
+def peak(post, controls):
+    form = deform.Form(Schema())
+    tracemalloc.start()
+    form.validate(controls(post))
+    result = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result
+
+
+def main():
+    for count in (10000, 100000):
+        post = make_post(count)
+        copied = peak(post, lambda post: list(post.items()))
+        streamed = peak(post, iter_controls)
+        print('%6d controls: list %6.1f MB, iter_controls %6.1f MB' % (
+            count, copied / 1e6, streamed / 1e6))
+
+
+if __name__ == '__main__':
+    main()
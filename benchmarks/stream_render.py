@@ -0,0 +1,67 @@
+"""
+Compares rendering a sequence-heavy form at once with streaming it through
+a FormStream: time to the first chunk, total time and peak memory allocated
+while rendering.  Run with::
+
+  python benchmarks/stream_render.py
+"""
+import time
+import tracemalloc
+
+import colander
+import deform
+
+from pyramid_deform import FormStream
+
+
+class Item(colander.MappingSchema):
+    name = colander.SchemaNode(colander.String())
+    quantity = colander.SchemaNode(colander.Int())
+    note = colander.SchemaNode(colander.String(), missing='')
+
+
+class Items(colander.SequenceSchema):
+    item = Item()
+
+
+class Schema(colander.MappingSchema):
+    title = colander.SchemaNode(colander.String())
+    items = Items()
+
+
+def measure(consume, items=500):
+    appstruct = {'title': 'Order',
+                 'items': [{'name': 'item%s' % num, 'quantity': num,
+                            'note': ''} for num in range(items)]}
+    form = deform.Form(Schema(), buttons=('submit',))
+    tracemalloc.start()
+    start = time.time()
+    first = consume(form, appstruct, start)
+    total = time.time() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return first, total, peak
+
+
+def render(form, appstruct, start):
+    form.render(appstruct)
+    return time.time() - start
+
+
+def stream(form, appstruct, start):
+    first = None
+    for chunk in FormStream(form, lambda: form.render(appstruct)):
+        if first is None:
+            first = time.time() - start
+    return first
+
+
+def main():
+    for name, consume in (('render', render), ('stream', stream)):
+        first, total, peak = measure(consume)
+        print('%s: first chunk %6.1f ms, total %6.1f ms, peak %6.1f MB' % (
+            name, first * 1e3, total * 1e3, peak / 1e6))
+
+
+if __name__ == '__main__':
+    main()
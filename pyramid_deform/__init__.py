@@ -1,29 +1,85 @@
 import os
 import binascii
+import copy
+import hashlib
+import itertools
+import re
+import threading
 import types
+import weakref
+from collections import OrderedDict
 
-from pkg_resources import resource_filename
+try:
+    from collections.abc import Mapping
+except ImportError: # pragma: no cover
+    from collections import Mapping
 
-import colander
-import deform
-import deform.form
-import deform.exception
-import deform.widget
-from deform.form import Button
+try:
+    from importlib.resources import files as resource_files
+except ImportError: # pragma: no cover
+    resource_files = None
+
+from importlib import import_module
 
 from pyramid.exceptions import ConfigurationError
 from pyramid.httpexceptions import HTTPFound
 from pyramid.i18n import get_localizer
 from pyramid.i18n import TranslationStringFactory
+from pyramid.settings import asbool
 from pyramid.threadlocal import get_current_request
+from pyramid.threadlocal import manager
 import sys
 
+class _LazyModule(object):
+    """
+    Stands for the module ``name`` in the namespace of this module until
+    one of its attributes is first used; the module is then imported and
+    replaces it.
+    """
+    def __init__(self, name):
+        self.__dict__['name'] = name
+
+    def __getattr__(self, attr):
+        name = self.__dict__['name']
+        module = import_module(name)
+        globals()[name] = module
+        try:
+            return getattr(module, attr)
+        except AttributeError:
+            return import_module('%s.%s' % (name, attr))
+
+colander = _LazyModule('colander')
+deform = _LazyModule('deform')
+
+class _lazy_attribute(object):
+    """
+    A class attribute whose value, the object named by the dotted name
+    ``dotted``, is imported on first access.
+    """
+    def __init__(self, dotted):
+        self.module, self.name = dotted.rsplit('.', 1)
+
+    def __get__(self, inst, cls):
+        return getattr(import_module(self.module), self.name)
+
+try:
+    from pyramid.csrf import check_csrf_token
+    from pyramid.csrf import get_csrf_token
+except ImportError: # pragma: no cover
+    from pyramid.session import check_csrf_token
+    get_csrf_token = None
+
 
 _ = TranslationStringFactory('pyramid_deform')
 
 # True if we are running on Python 3.
 PY3 = sys.version_info[0] == 3
 
+try:
+    from html import escape
+except ImportError: # pragma: no cover
+    from cgi import escape
+
 if PY3: # pragma: no cover
     string_types = str,
     integer_types = int,
@@ -39,13 +95,729 @@ else:
     binary_type = str
     long = long
 
+def resource_filename(package, name):
+    """
+    Return the filesystem path of the resource ``name`` of ``package``,
+    using :mod:`importlib.resources` (``pkg_resources``, which is slow to
+    import, is only used on Python versions lacking it).
+    """
+    if resource_files is None: # pragma: no cover
+        from pkg_resources import resource_filename
+        return resource_filename(package, name)
+    return str(resource_files(package).joinpath(name))
+
+class SchemaBinder(object):
+    """
+    Binds a Colander ``schema`` without cloning all of it.
+
+    The schema is scanned once, when the binder is created, to find the
+    nodes which carry ``colander.deferred`` attributes or whose
+    ``validator`` or ``preparer`` may read ``node.bindings`` (any callable
+    but Colander's own validators).  :meth:`bind` copies only those nodes
+    and their ancestors, which receive a ``bindings`` attribute; every
+    other node is shared between the original schema and each bound
+    schema, and its ``bindings`` stay ``None``.  Subtrees whose root
+    defines ``after_bind`` are bound with a regular ``schema.bind``, as are
+    those whose children were added, removed or renamed since the scan;
+    the schema is scanned again when its own children changed.
+    """
+    def __init__(self, schema):
+        self.schema = schema
+        self._rescan()
+
+    def _rescan(self):
+        self.child_names = _child_names(self.schema)
+        self.plan = self._scan(self.schema)
+
+    def _scan(self, node):
+        if getattr(node, 'after_bind', None):
+            return True
+        names = tuple(name for name in dir(node)
+                      if isinstance(getattr(node, name), colander.deferred))
+        children = tuple(self._scan(child) for child in node.children)
+        if (not names and all(plan is None for plan in children) and
+            not reads_bindings(getattr(node, 'validator', None)) and
+            not reads_bindings(getattr(node, 'preparer', None))):
+            return None
+        return names, children, _child_names(node)
+
+    def bind(self, **kw):
+        """
+        Return a bound version of the schema, resolving its deferred values
+        with ``kw``.  The original schema is not modified.
+        """
+        if _child_names(self.schema) != self.child_names:
+            self._rescan()
+        if self.plan is None:
+            return self.schema
+        return self._bind(self.schema, self.plan, kw)
+
+    def varies(self, splice_fields=()):
+        """
+        Return whether the rendering of a bound schema may depend on its
+        bindings: whether any of its nodes, other than the top-level
+        children named in ``splice_fields``, carries deferred values or
+        defines ``after_bind``.  Validators and preparers reading the
+        bindings do not count, as rendering does not call them.
+        """
+        if _child_names(self.schema) != self.child_names:
+            self._rescan()
+        plan = self.plan
+        if plan is None:
+            return False
+        if plan is True or plan[0]:
+            return True
+        return any(
+            self._varies(child_plan)
+            for child, child_plan in zip(self.schema.children, plan[1])
+            if child.name not in splice_fields)
+
+    def _varies(self, plan):
+        if plan is None:
+            return False
+        if plan is True:
+            return True
+        names, child_plans, child_names = plan
+        return bool(names) or any(self._varies(child_plan)
+                                  for child_plan in child_plans)
+
+    def _bind(self, node, plan, kw):
+        if plan is True or _child_names(node) != plan[2]:
+            # an after_bind, or children changed since the scan
+            return node.bind(**kw)
+        names, child_plans, child_names = plan
+        # object.__new__ skips SchemaNode.__new__, which would recreate the
+        # class-level children only to have them replaced below
+        bound = object.__new__(node.__class__)
+        bound.__dict__.update(node.__dict__)
+        bound.bindings = kw
+        bound.children = [
+            child if child_plan is None else self._bind(child, child_plan, kw)
+            for child, child_plan in zip(node.children, child_plans)
+            ]
+        for name in names:
+            value = getattr(bound, name)(bound, kw)
+            if isinstance(value, colander.SchemaNode):
+                _add_bound_child(bound, name, value)
+            else:
+                setattr(bound, name, value)
+        return bound
+
+def _child_names(node):
+    return tuple(child.name for child in node.children)
+
+def reads_bindings(func):
+    """
+    Return whether the validator or preparer ``func`` (or any of a list of
+    them) may read the ``bindings`` of the node it is called with, which is
+    the case of any callable but Colander's own validators.
+    """
+    if func is None:
+        return False
+    if isinstance(func, (list, tuple)):
+        return any(reads_bindings(f) for f in func)
+    if isinstance(func, (colander.All, colander.Any)):
+        return reads_bindings(func.validators)
+    if isinstance(func, colander.Function):
+        return True
+    return getattr(func, '__module__', None) != 'colander'
+
+def _add_bound_child(node, name, child):
+    # mirrors what colander does for deferreds which resolve to a node
+    if not child.name:
+        child.name = name
+    if child.raw_title is colander.required:
+        child.title = name.replace('_', ' ').title()
+    insert_before = getattr(child, 'insert_before', None)
+    exists = node.get(child.name) is not None
+    if insert_before is None:
+        if exists:
+            node[child.name] = child
+        else:
+            node.add(child)
+    else:
+        if exists:
+            del node[child.name]
+        node.add_before(insert_before, child)
+
+_bound_schemas = weakref.WeakSet()
+
+def schema_binder(schema):
+    """
+    Return the :class:`SchemaBinder` of ``schema``, which is created the
+    first time it is asked for and kept on the schema afterwards.
+    """
+    # kept on the schema, so that both are collected together; copies of
+    # the schema (which share its attributes) get binders of their own
+    binder = schema.__dict__.get('_pyramid_deform_binder')
+    if binder is None or binder.schema is not schema:
+        binder = schema._pyramid_deform_binder = SchemaBinder(schema)
+    return binder
+
+def bind_schema(schema, **kw):
+    """
+    Bind ``schema`` with ``kw`` using a :class:`SchemaBinder` which is
+    created the first time ``schema`` is bound and reused afterwards.
+    Schemas returned by this function are returned unchanged if they are
+    passed to it again.
+    """
+    if schema in _bound_schemas:
+        return schema
+    bound = schema_binder(schema).bind(**kw)
+    if bound is not schema:
+        _bound_schemas.add(bound)
+    return bound
+
+class FormCache(object):
+    """
+    Process-wide cache of prototype forms used by :class:`FormView` when its
+    :attr:`FormView.cache_forms` attribute is true.
+
+    Prototypes are built from the *unbound* schema; each request receives a
+    cheap copy of the prototype whose fields are pointed at the request's
+    bound schema.  They are keyed on the schema instance, so caching only
+    pays off for schemas which outlive requests (such as a class-level
+    :attr:`FormView.schema`); the ``maxsize`` most recently used
+    prototypes are kept.  ``hits`` and ``misses`` count cache lookups.  The
+    widget resources computed by :meth:`FormView.widget_resources` are kept
+    in ``resources``, with the same bound (see :meth:`get_resources`).
+    """
+    def __init__(self, maxsize=100):
+        self.maxsize = maxsize
+        self.prototypes = OrderedDict()
+        self.resources = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, factory):
+        """
+        Return the prototype stored under ``key``, calling ``factory`` to
+        create (and store) it when missing.  Unhashable keys are never
+        cached.
+        """
+        try:
+            hash(key)
+        except TypeError:
+            self.misses += 1
+            return factory()
+        with self.lock:
+            prototype = self._lookup(self.prototypes, key)
+            if prototype is not None:
+                self.hits += 1
+                return prototype
+            self.misses += 1
+        return self._store(self.prototypes, key, factory())
+
+    def get_resources(self, key, factory):
+        """
+        Return the widget resources stored under ``key``, calling
+        ``factory`` to compute (and store) them when missing.
+        """
+        with self.lock:
+            resources = self._lookup(self.resources, key)
+        if resources is None:
+            resources = self._store(self.resources, key, factory())
+        return resources
+
+    def _lookup(self, entries, key):
+        value = entries.pop(key, None)
+        if value is not None:
+            entries[key] = value
+        return value
+
+    def _store(self, entries, key, value):
+        with self.lock:
+            value = entries.setdefault(key, value)
+            while len(entries) > self.maxsize:
+                entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.prototypes.clear()
+            self.resources.clear()
+            self.hits = 0
+            self.misses = 0
+
+form_cache = FormCache()
+
+def _copy_field(field, counter, parent=None):
+    # a shallow copy of each field; widgets, renderer and buttons are shared
+    # with the prototype, per-request state (cstruct, error, the counter
+    # numbering the fields cloned later) is not.
+    copied = copy.copy(field)
+    copied.counter = counter
+    if parent is not None:
+        copied._parent = weakref.ref(parent)
+    copied.children = [_copy_field(child, counter, copied)
+                       for child in field.children]
+    return copied
+
+def _last_order(field):
+    return max([field.order] +
+               [_last_order(child) for child in field.children])
+
+def _rebind_field(field, node):
+    if field.schema is not node:
+        field.schema = node
+        field.typ = node.typ
+        field.title = node.title
+        field.description = node.description
+        field.required = node.required
+        if isinstance(field.__dict__.get('widget'), colander.deferred):
+            del field.__dict__['widget']
+    for child, child_node in zip(field.children, node.children):
+        _rebind_field(child, child_node)
+
+def matches_schema(field, node):
+    """
+    Return whether the fields of ``field`` (for instance a prototype form)
+    correspond, by name, node class and type class, to the nodes of the
+    schema ``node``.  Binding may change a schema's structure (an
+    ``after_bind`` removing a node, a deferred resolving to a node), in
+    which case :func:`copy_form` cannot be used.
+    """
+    schema = field.schema
+    if (schema.__class__ is not node.__class__ or
+        schema.typ.__class__ is not node.typ.__class__ or
+        len(field.children) != len(node.children)):
+        return False
+    for child, child_node in zip(field.children, node.children):
+        if child.name != child_node.name or not matches_schema(child,
+                                                               child_node):
+            return False
+    return True
+
+def copy_form(prototype, schema):
+    """
+    Return a copy of the ``prototype`` form whose fields use the nodes of
+    ``schema`` (a bound version of the schema the prototype was built from)
+    and whose values are set to the bound schema's defaults.  The schema
+    must have the prototype's structure (see :func:`matches_schema`).
+    """
+    # the counter of a fresh form would be past the prototype's fields
+    counter = itertools.count(_last_order(prototype) + 1)
+    form = _copy_field(prototype, counter)
+    _rebind_field(form, schema)
+    form.set_appstruct(colander.null)
+    return form
+
+class RenderCache(object):
+    """
+    A thread-safe, size-bounded LRU cache of rendered form HTML which may be
+    assigned to :attr:`FormView.render_cache`.  ``maxsize`` is the number of
+    renderings kept; ``hits`` and ``misses`` count lookups.  Any object with
+    the same ``get`` and ``set`` methods may be used instead.
+    """
+    def __init__(self, maxsize=100):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            html = self.entries.pop(key, None)
+            if html is None:
+                self.misses += 1
+            else:
+                self.entries[key] = html
+                self.hits += 1
+            return html
+
+    def set(self, key, html):
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = html
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+_splice_token = binascii.hexlify(os.urandom(8)).decode('ascii')
+
+# the most recently used dispatch tables, bounded as forms built per
+# request may have buttons with generated names
+_dispatch_tables = OrderedDict()
+_dispatch_tables_lock = threading.Lock()
+_dispatch_tables_maxsize = 1000
+
+def _button_names(buttons):
+    """
+    Return a tuple of the names of ``buttons``, a sequence of
+    ``deform.form.Button`` instances or strings (as in
+    :attr:`FormView.buttons`).
+    """
+    return tuple(isinstance(button, string_types) and button or button.name
+                 for button in buttons)
+
+def _dispatch_table(view_class, buttons):
+    """
+    Return a ``(names, handlers)`` pair for the ``buttons`` of
+    ``view_class``: a frozenset of their names, and a dict mapping each name
+    to the names of its ``<name>_success`` and ``<name>_failure`` handler
+    methods.  Tables are computed once per view class and button names;
+    the 1000 most recently used are kept.
+    """
+    key = (view_class, _button_names(buttons))
+    with _dispatch_tables_lock:
+        table = _dispatch_tables.pop(key, None)
+        if table is not None:
+            _dispatch_tables[key] = table
+            return table
+    handlers = dict((name, ('%s_success' % name, '%s_failure' % name))
+                    for name in key[1])
+    table = (frozenset(key[1]), handlers)
+    with _dispatch_tables_lock:
+        _dispatch_tables[key] = table
+        while len(_dispatch_tables) > _dispatch_tables_maxsize:
+            _dispatch_tables.popitem(last=False)
+    return table
+
+def iter_controls(post):
+    """
+    Return an iterator over the ``(name, value)`` pairs of ``post`` (such
+    as WebOb's ``request.POST`` multidict) in document order, for
+    ``form.validate``.  Unlike ``post.items()`` on Python 2, it does not
+    copy the pairs into a new list; Peppercorn consumes it in one pass.
+    """
+    iteritems = getattr(post, 'iteritems', None)
+    if iteritems is None:
+        return iter(post.items())
+    return iteritems()
+
+def find_concurrent_validators(node, value, path=()):
+    """
+    Yield a ``(path, node, value)`` tuple for each node of the schema
+    ``node`` having a ``concurrent_validator`` attribute, where ``value`` is
+    the node's part of the deserialized ``value`` and ``path`` a sequence of
+    ``(position, node)`` pairs leading to it.  Null values are skipped.
+    """
+    if value is colander.null:
+        return
+    validator = getattr(node, 'concurrent_validator', None)
+    if validator is not None:
+        yield path, node, value
+    children = getattr(node, 'children', ())
+    if not children:
+        return
+    typ = getattr(node, 'typ', None)
+    if isinstance(typ, colander.Mapping):
+        items = [(pos, child, value.get(child.name, colander.null))
+                 for pos, child in enumerate(children)]
+    elif isinstance(typ, colander.Sequence):
+        items = [(pos, children[0], item) for pos, item in enumerate(value)]
+    elif isinstance(typ, colander.Tuple):
+        items = [(pos, child, value[pos])
+                 for pos, child in enumerate(children)]
+    else:
+        items = ()
+    for pos, child, child_value in items:
+        for found in find_concurrent_validators(
+            child, child_value, path + ((pos, child),)):
+            yield found
+
+def find_concurrent_validators_in_failure(node, cstruct, error, path=()):
+    """
+    Like :func:`find_concurrent_validators`, for a schema ``node`` whose
+    validation of ``cstruct`` failed with the ``colander.Invalid``
+    ``error``: the subtrees without errors are deserialized and searched
+    for concurrent validators, the others are skipped.
+    """
+    if error is None:
+        try:
+            value = node.deserialize(cstruct)
+        except colander.Invalid:
+            return
+        for found in find_concurrent_validators(node, value, path):
+            yield found
+        return
+    children = getattr(node, 'children', ())
+    if not children or cstruct in (colander.null, None):
+        return
+    errors = dict((child.pos, child) for child in error.children)
+    typ = getattr(node, 'typ', None)
+    try:
+        if isinstance(typ, colander.Mapping):
+            items = [(pos, child, cstruct.get(child.name, colander.null))
+                     for pos, child in enumerate(children)]
+        elif isinstance(typ, colander.Sequence):
+            items = [(pos, children[0], item)
+                     for pos, item in enumerate(cstruct)]
+        elif isinstance(typ, colander.Tuple):
+            items = [(pos, child, cstruct[pos])
+                     for pos, child in enumerate(children)]
+        else:
+            items = ()
+    except (AttributeError, IndexError, KeyError, TypeError):
+        return
+    for pos, child, child_cstruct in items:
+        for found in find_concurrent_validators_in_failure(
+            child, child_cstruct, errors.get(pos), path + ((pos, child),)):
+            yield found
+
+_validator_executor = None
+_validator_lock = threading.Lock()
+
+def default_validator_executor():
+    """
+    Return the thread pool (of ``8`` workers, created on first use) which
+    runs concurrent validators unless :attr:`FormView.validator_executor`
+    says otherwise.
+    """
+    global _validator_executor
+    with _validator_lock:
+        if _validator_executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            _validator_executor = ThreadPoolExecutor(8)
+    return _validator_executor
+
+def call_validator(request, node, value):
+    """
+    Call the ``concurrent_validator`` of ``node`` with ``value``, with
+    ``request`` pushed onto Pyramid's thread locals.  Returns the
+    ``colander.Invalid`` raised, if any.
+    """
+    manager.push({'request': request, 'registry': request.registry})
+    try:
+        node.concurrent_validator(node, value)
+    except colander.Invalid as e:
+        return e
+    finally:
+        manager.pop()
+
+def run_concurrent_validators(checks, request, executor=None):
+    """
+    Run the validators of ``checks`` (as yielded by
+    :func:`find_concurrent_validators`) concurrently in ``executor``
+    (by default :func:`default_validator_executor`) and return a list of
+    ``(path, error)`` tuples for those which failed.
+    """
+    if len(checks) == 1:
+        path, node, value = checks[0]
+        results = [call_validator(request, node, value)]
+    else:
+        if executor is None:
+            executor = default_validator_executor()
+        futures = [executor.submit(call_validator, request, node, value)
+                   for path, node, value in checks]
+        results = [future.result() for future in futures]
+    return [(check[0], error) for check, error in zip(checks, results)
+            if error is not None]
+
+def raise_validation_failure(form, errors, root=None):
+    """
+    Merge ``errors`` (as returned by :func:`run_concurrent_validators`)
+    into a single ``colander.Invalid`` for the schema of the validated
+    ``form`` (or into ``root``, the error its validation failed with) and
+    raise the resulting :class:`deform.exception.ValidationFailure`.
+    """
+    if root is None:
+        root = colander.Invalid(form.schema)
+    for path, error in errors:
+        if not path:
+            root.msg = error.msg
+            for child in error.children:
+                root.add(child, child.pos)
+            continue
+        parent = root
+        for pos, node in path[:-1]:
+            for child in parent.children:
+                if child.pos == pos:
+                    parent = child
+                    break
+            else:
+                child = colander.Invalid(node)
+                parent.add(child, pos)
+                parent = child
+        parent.add(error, path[-1][0])
+    form.widget.handle_error(form, root)
+    raise deform.exception.ValidationFailure(form, form.cstruct, root)
+
+class StreamingRenderer(object):
+    """
+    Wraps the template ``renderer`` of a form's fields so the form can be
+    rendered piecewise by :meth:`expand`.
+
+    A template rendered from within another one, for the field it renders
+    (through its widget), one of its children or one of its sequence items,
+    is not rendered at once: a marker is returned in its place, which
+    :meth:`expand` later replaces by the template's output.  Any other
+    template (such as a sequence's prototype, whose output is quoted) is
+    rendered at once.
+    """
+    def __init__(self, renderer):
+        self.renderer = renderer
+        self.deferred = {}
+        self.allowed = None
+        self.eager = 0
+        self.count = 0
+        self.prefix = 'pyramid-deform-stream-%s-' % _splice_token
+        self.markers = re.compile('(<!--%s\\d+-->)' % self.prefix)
+
+    def __getattr__(self, name):
+        return getattr(self.renderer, name)
+
+    def __call__(self, template, **kw):
+        allowed = self.allowed
+        if self.eager or (allowed is not None and
+                          id(kw.get('field')) not in allowed):
+            self.eager += 1
+            try:
+                return self.renderer(template, **kw)
+            finally:
+                self.eager -= 1
+        self.count += 1
+        marker = '<!--%s%d-->' % (self.prefix, self.count)
+        self.deferred[marker] = (template, kw)
+        return marker
+
+    def expand(self, text):
+        """
+        Yield the pieces of ``text``, rendering the templates whose markers
+        it contains in turn.
+        """
+        for piece in self.markers.split(text):
+            deferred = self.deferred.pop(piece, None)
+            if deferred is None:
+                if piece:
+                    yield piece
+                continue
+            template, kw = deferred
+            field = kw.get('field')
+            allowed = set([id(field)])
+            allowed.update(id(child) for child in
+                           getattr(field, 'children', ()))
+            allowed.update(id(subfield) for cstruct, subfield in
+                           kw.get('subfields', ()))
+            self.allowed = allowed
+            for chunk in self.expand(self.renderer(template, **kw)):
+                yield chunk
+
+def iter_render(field, render, chunk_size=16384):
+    """
+    Call ``render`` (for instance ``field.render``), which renders the
+    deform ``field``, and yield its output in chunks of at least
+    ``chunk_size`` characters (except the last one) as the templates of the
+    field and its descendants are rendered.
+    """
+    renderer = StreamingRenderer(field.renderer)
+    fields = [field]
+    saved = []
+    while fields:
+        descendant = fields.pop()
+        saved.append((descendant, descendant.renderer))
+        descendant.renderer = renderer
+        fields.extend(descendant.children)
+    try:
+        pieces = []
+        size = 0
+        for piece in renderer.expand(render()):
+            pieces.append(piece)
+            size += len(piece)
+            if size >= chunk_size:
+                yield ''.join(pieces)
+                pieces = []
+                size = 0
+        if pieces:
+            yield ''.join(pieces)
+    finally:
+        for descendant, original in saved:
+            descendant.renderer = original
+
+_form_tag = re.compile(r'<form\b[^>]*>')
+
+def csrf_token(request):
+    """
+    Return the CSRF token of ``request`` from the CSRF storage policy of
+    the application (see ``pyramid.csrf.get_csrf_token``), or from its
+    session before Pyramid 1.9.
+    """
+    if get_csrf_token is None: # pragma: no cover
+        return request.session.get_csrf_token()
+    return get_csrf_token(request)
+
+class FormStream(object):
+    """
+    A form rendering produced lazily, returned by :class:`FormView` as
+    ``form`` when its :attr:`FormView.stream` attribute is true.
+
+    Iterating over it renders the form, yielding chunks of HTML (see
+    :func:`iter_render`).  Used as a string (for instance with
+    ``structure`` in a Chameleon template) it renders the whole form, while
+    :meth:`app_iter` lets it feed a response's ``app_iter``.
+
+    The current request and registry are captured when the stream is
+    created and made available to Pyramid's thread locals while it renders,
+    so that a response iterated after the request was handled is still
+    translated.
+    """
+    #: A callable applied to the first chunk, which holds the opening tag
+    #: of the form, or ``None``.
+    head_filter = None
+
+    def __init__(self, field, render, chunk_size=16384):
+        self.field = field
+        self.render = render
+        self.chunk_size = chunk_size
+        self.threadlocals = manager.get()
+
+    def __iter__(self):
+        chunks = self._with_threadlocals(
+            iter_render(self.field, self.render, self.chunk_size))
+        if self.head_filter is None:
+            return chunks
+        return self._filter_head(chunks)
+
+    def _with_threadlocals(self, chunks):
+        while True:
+            manager.push(self.threadlocals)
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                return
+            finally:
+                manager.pop()
+            yield chunk
+
+    def _filter_head(self, chunks):
+        for chunk in chunks:
+            yield self.head_filter(chunk)
+            break
+        for chunk in chunks:
+            yield chunk
+
+    def __html__(self):
+        return ''.join(self)
+
+    __str__ = __html__
+
+    def app_iter(self, header='', footer='', encoding='utf-8'):
+        """
+        Yield ``header``, the chunks of the form and ``footer``, encoded
+        with ``encoding``: for example
+        ``Response(app_iter=stream.app_iter(header, footer))``.
+        """
+        if header:
+            yield header.encode(encoding)
+        for chunk in self:
+            yield chunk.encode(encoding)
+        if footer:
+            yield footer.encode(encoding)
+
 class FormView(object):
     """
     Helper view for Deform forms for use with the Pyramid framework.
     """
     #: Class object of the type of form to be created.
     #: Defaults to using the standard :class:`deform.form.Form` class.
-    form_class = deform.form.Form
+    form_class = _lazy_attribute('deform.form.Form')
 
     #: Tuple of buttons or strings to pass to the form instance.
     #: Override in your derived class.
@@ -60,6 +832,64 @@ class FormView(object):
     #: passed to this class' ``__init__`` can be provided here.
     form_options = ()
 
+    #: If true, the form is built once per process from the unbound
+    #: :attr:`schema` and copied for each request instead of being
+    #: constructed from scratch (see :class:`FormCache`).  Widgets are
+    #: shared between requests, so :meth:`before` must not modify them.
+    #: The form's widget resources are also computed only once (see
+    #: :meth:`widget_resources`).  Prototypes are keyed on the schema
+    #: instance, so this requires a class-level :attr:`schema`, not one
+    #: built for each request.
+    cache_forms = False
+
+    #: If true, :attr:`schema` is bound with :func:`bind_schema`, which
+    #: copies only the nodes holding deferred values (or validators and
+    #: preparers of their own) instead of cloning the whole schema on every
+    #: request.  Other nodes are shared and their ``bindings`` are
+    #: ``None``: code reading the bindings of arbitrary nodes, such as
+    #: widgets, must not be used with it.
+    incremental_bind = False
+
+    #: A :class:`RenderCache` (or compatible object) used by :meth:`show`
+    #: to reuse renderings of the form.  Only enable it for views whose
+    #: schema, buttons and options do not vary between requests.  Forms
+    #: whose schema has deferred values (or ``after_bind`` methods) other
+    #: than those of the :attr:`splice_fields` are never cached, as their
+    #: rendering may depend on the request (see :meth:`render_cacheable`).
+    render_cache = None
+
+    #: Names of top-level fields whose values vary per request; they are
+    #: spliced into cached renderings by :meth:`show`.
+    splice_fields = ('csrf_token',)
+
+    #: The :class:`concurrent.futures.Executor` :meth:`validate` runs
+    #: concurrent validators in; ``None`` means a shared pool of 8 threads.
+    validator_executor = None
+
+    #: If true, :meth:`show` and :meth:`failure` return a
+    #: :class:`FormStream` which renders the form as it is iterated over,
+    #: rather than the rendered form.
+    stream = False
+
+    #: The minimum size, in characters, of the chunks a :class:`FormStream`
+    #: yields.
+    stream_chunk_size = 16384
+
+    #: If true, :meth:`__call__` checks the CSRF token of ``POST`` requests
+    #: (see :meth:`check_csrf`) before building the form, and the rendered
+    #: form gets a hidden field holding the token (see
+    #: :meth:`add_csrf_field`), so the schema needs no CSRF node: use it
+    #: instead of :class:`CSRFSchema`.
+    csrf = False
+
+    #: The name of the ``POST`` field holding the CSRF token when
+    #: :attr:`csrf` is true.
+    csrf_field = 'csrf_token'
+
+    #: The name of the request header which may hold the CSRF token instead
+    #: of :attr:`csrf_field` when :attr:`csrf` is true.
+    csrf_header = 'X-CSRF-Token'
+
     def __init__(self, request):
         self.request = request
 
@@ -90,29 +920,21 @@ class FormView(object):
         Returns a ``dict`` structure suitable for provision tog the given
         view. By default, this is the page template specified 
         """
-        use_ajax = getattr(self, 'use_ajax', False)
-        ajax_options = getattr(self, 'ajax_options', '{}')
-        self.schema = self.schema.bind(**self.get_bind_data())
-        form = self.form_class(self.schema, buttons=self.buttons,
-                               use_ajax=use_ajax, ajax_options=ajax_options,
-                               **dict(self.form_options))
+        if self.csrf and self.request.method == 'POST':
+            self.check_csrf()
+        form = self._make_form(self.get_bind_data())
         self.before(form)
-        reqts = form.get_widget_resources()
+        reqts = self._get_resources(form)
         result = None
 
-        for button in form.buttons:
-            if button.name in self.request.POST:
-                success_method = getattr(self, '%s_success' % button.name)
-                try:
-                    controls = self.request.POST.items()
-                    validated = form.validate(controls)
-                    result = success_method(validated)
-                except deform.exception.ValidationFailure as e:
-                    fail = getattr(self, '%s_failure' % button.name, None)
-                    if fail is None:
-                        fail = self.failure
-                    result = fail(e)
-                break
+        button = self.submitted(form)
+        if button is not None:
+            success_method, fail = self.handlers(form, button)
+            try:
+                validated = self.validate(form, self.controls())
+                result = success_method(validated)
+            except deform.exception.ValidationFailure as e:
+                result = fail(e)
 
         if result is None:
             result = self.show(form)
@@ -123,6 +945,134 @@ class FormView(object):
 
         return result
 
+    def _make_form(self, bind_data):
+        use_ajax = getattr(self, 'use_ajax', False)
+        ajax_options = getattr(self, 'ajax_options', '{}')
+        unbound = self._unbound_schema = self.schema
+        if self.incremental_bind:
+            self.schema = bind_schema(self.schema, **bind_data)
+        else:
+            self.schema = self.schema.bind(**bind_data)
+        if self.cache_forms:
+            key = (self.__class__, unbound, self.form_class,
+                   tuple(self.buttons), use_ajax, ajax_options,
+                   tuple(self.form_options))
+            factory = lambda: self.form_class(
+                unbound, buttons=self.buttons, use_ajax=use_ajax,
+                ajax_options=ajax_options, **dict(self.form_options))
+            prototype = form_cache.get(key, factory)
+            # binding may have changed the schema's structure
+            if matches_schema(prototype, self.schema):
+                return copy_form(prototype, self.schema)
+        return self.form_class(self.schema, buttons=self.buttons,
+                               use_ajax=use_ajax, ajax_options=ajax_options,
+                               **dict(self.form_options))
+
+    def _get_resources(self, form):
+        if self.cache_forms:
+            reqts = self.widget_resources(form)
+        else:
+            reqts = form.get_widget_resources()
+        bundler = getattr(self.request.registry, 'pyramid_deform_bundler',
+                          None)
+        if bundler is not None:
+            reqts = {'js': list(bundler.bundle(reqts['js'], 'js')),
+                     'css': list(bundler.bundle(reqts['css'], 'css'))}
+        return reqts
+
+    def validate(self, form, controls):
+        """
+        Validate ``controls`` with ``form`` and return the result.
+
+        After the schema's own validators, the ``concurrent_validator`` of
+        each node which has one is run, all at once, in
+        :attr:`validator_executor`.  Such validators take the same
+        arguments and raise the same ``colander.Invalid`` as Colander
+        validators, and suit checks waiting on I/O (database lookups,
+        remote services).  When the schema's validators fail, those of the
+        subtrees which validated still run (see
+        :func:`find_concurrent_validators_in_failure`).  All errors are
+        raised together as a :class:`deform.exception.ValidationFailure`.
+        """
+        try:
+            validated = form.validate(controls)
+        except deform.exception.ValidationFailure as e:
+            checks = list(find_concurrent_validators_in_failure(
+                form.schema, e.cstruct, e.error))
+            if checks:
+                errors = run_concurrent_validators(checks, self.request,
+                                                   self.validator_executor)
+                if errors:
+                    raise_validation_failure(form, errors, e.error)
+            raise
+        checks = list(find_concurrent_validators(form.schema, validated))
+        if checks:
+            errors = run_concurrent_validators(checks, self.request,
+                                               self.validator_executor)
+            if errors:
+                raise_validation_failure(form, errors)
+        return validated
+
+    def submitted(self, form):
+        """
+        Return the button of ``form`` whose name is in the request's
+        ``POST`` data, or ``None`` if the form was not submitted.  The
+        ``POST`` keys are scanned once.
+        """
+        names = _dispatch_table(self.__class__, form.buttons)[0]
+        present = names.intersection(self.request.POST.keys())
+        if present:
+            for button in form.buttons:
+                if button.name in present:
+                    return button
+        return None
+
+    def handlers(self, form, button):
+        """
+        Return the pair of methods handling the success and the failure of
+        the validation of ``form`` when submitted with ``button``: its
+        ``<name>_success`` method, and its ``<name>_failure`` method if
+        there is one, :meth:`failure` otherwise.
+        """
+        success_name, failure_name = _dispatch_table(
+            self.__class__, form.buttons)[1][button.name]
+        fail = getattr(self, failure_name, None)
+        if fail is None:
+            fail = self.failure
+        return getattr(self, success_name), fail
+
+    def controls(self):
+        """
+        Return the submitted controls to validate, an iterator over the
+        request's ``POST`` data (see :func:`iter_controls`).
+        """
+        return iter_controls(self.request.POST)
+
+    def widget_resources(self, form=None):
+        """
+        Return the widget resources of this view's form as a ``dict`` with
+        ``js`` and ``css`` keys.
+
+        The resources are computed once per view class, :attr:`form_class`
+        and :attr:`schema` and then kept in :data:`form_cache`, so they must
+        not depend on the request.  ``form`` is used to compute them if
+        given; otherwise, the first call binds :attr:`schema` with
+        :meth:`get_bind_data` and builds a form (passed to :meth:`before`)
+        for the purpose.  Later calls do not build a form at all.
+        """
+        schema = getattr(self, '_unbound_schema', self.schema)
+        key = (self.__class__, self.form_class, schema)
+        def factory():
+            built = form
+            if built is None:
+                built = self.form_class(schema.bind(**self.get_bind_data()))
+                self.before(built)
+            reqts = built.get_widget_resources()
+            return {'js': tuple(reqts['js']), 'css': tuple(reqts['css'])}
+        reqts = form_cache.get_resources(key, factory)
+        # lists, as deform returns, which callers may modify
+        return {'js': list(reqts['js']), 'css': list(reqts['css'])}
+
     def before(self, form):
         """
         Performs some processing on the ``form`` prior to rendering.
@@ -155,8 +1105,12 @@ class FormView(object):
         (an instance of :class:`deform.exception.ValidationFailure`) as the
         ``form`` key in a ``dict`` structure. 
         """
+        if self.stream:
+            rendered = FormStream(e.field, e.render, self.stream_chunk_size)
+        else:
+            rendered = e.render()
         return {
-            'form': e.render(),
+            'form': self.add_csrf_field(rendered),
             }
 
     def show(self, form):
@@ -168,37 +1122,206 @@ class FormView(object):
         Returns the rendered form as the ``form`` key in a ``dict`` structure.
         """
         appstruct = self.appstruct()
-        if appstruct is None:
+        if self.stream:
+            rendered = self.render_stream(form, appstruct)
+        elif self.render_cache is not None and self.render_cacheable():
+            rendered = self.render_cached(form, appstruct)
+        elif appstruct is None:
             rendered = form.render()
         else:
             rendered = form.render(appstruct)
         return {
-            'form': rendered,
+            'form': self.add_csrf_field(rendered),
             }
 
+    def check_csrf(self):
+        """
+        Raise :exc:`pyramid.exceptions.BadCSRFToken` (a ``400 Bad
+        Request``) unless the :attr:`csrf_field` of the request's ``POST``
+        data, or else its :attr:`csrf_header` header, matches the request's
+        CSRF token, as checked by ``pyramid.csrf.check_csrf_token``.
+        """
+        check_csrf_token(self.request, token=self.csrf_field,
+                         header=self.csrf_header)
+
+    def add_csrf_field(self, rendered):
+        """
+        Return the ``rendered`` form (a string or a :class:`FormStream`)
+        with a hidden :attr:`csrf_field` holding the request's CSRF token
+        (see :func:`csrf_token`) inserted after its opening tag, if
+        :attr:`csrf` is true.
+        """
+        if not self.csrf:
+            return rendered
+        field = '<input type="hidden" name="%s" value="%s"/>' % (
+            escape(self.csrf_field, True),
+            escape(csrf_token(self.request), True))
+        insert = lambda html: _form_tag.sub(
+            lambda match: match.group(0) + field, html, 1)
+        if isinstance(rendered, FormStream):
+            rendered.head_filter = insert
+            return rendered
+        return insert(rendered)
+
+    def render_stream(self, form, appstruct=None):
+        """
+        Return a :class:`FormStream` rendering ``form``, with ``appstruct``
+        unless it is ``None``.
+        """
+        if appstruct is None:
+            render = form.render
+        else:
+            render = lambda: form.render(appstruct)
+        return FormStream(form, render, self.stream_chunk_size)
+
+    def render_cacheable(self):
+        """
+        Return whether renderings of the form may be kept in
+        :attr:`render_cache`: whether no deferred value of :attr:`schema`,
+        other than those of the fields named in :attr:`splice_fields`,
+        is resolved when binding it (see :meth:`SchemaBinder.varies`).
+        """
+        schema = getattr(self, '_unbound_schema', self.schema)
+        return not schema_binder(schema).varies(self.splice_fields)
+
+    def render_key(self, form, appstruct):
+        """
+        Return the :attr:`render_cache` key for rendering ``form`` with
+        ``appstruct``: the view class, the form id, a digest of the form's
+        ``cstruct`` (which ``form.set_appstruct(appstruct)`` set) less the
+        fields named in :attr:`splice_fields`, and the request's locale
+        name.  The ``cstruct`` holds what is rendered, serialized to
+        strings, whereas the ``repr`` of arbitrary application objects in
+        the ``appstruct`` need not tell them apart.
+        """
+        cstruct = form.cstruct
+        if isinstance(cstruct, dict):
+            cstruct = [(name, value) for name, value in cstruct.items()
+                       if name not in self.splice_fields]
+        digest = hashlib.sha1(repr(cstruct).encode('utf-8')).hexdigest()
+        locale_name = get_localizer(self.request).locale_name
+        return (self.__class__, form.formid, digest, locale_name)
+
+    def render_cached(self, form, appstruct):
+        """
+        Render ``form`` with ``appstruct`` through :attr:`render_cache`,
+        which :meth:`render_cacheable` must allow.
+
+        On a miss the fields named in :attr:`splice_fields` are rendered
+        with placeholders and the result is cached; the current values of
+        those fields are then substituted for the placeholders.
+        """
+        if appstruct is not None:
+            form.set_appstruct(appstruct)
+        fields = [form[name] for name in self.splice_fields if name in form]
+        key = self.render_key(form, appstruct)
+        rendered = self.render_cache.get(key)
+        if rendered is None:
+            values = [field.cstruct for field in fields]
+            for field in fields:
+                field.cstruct = self._placeholder(field)
+            try:
+                rendered = form.render()
+            finally:
+                for field, value in zip(fields, values):
+                    field.cstruct = value
+            self.render_cache.set(key, rendered)
+        for field in fields:
+            value = field.cstruct
+            if value is colander.null:
+                value = ''
+            rendered = rendered.replace(self._placeholder(field),
+                                        escape(text_type(value), True))
+        return rendered
+
+    def _placeholder(self, field):
+        return 'pyramid-deform-%s-%s' % (_splice_token, field.name)
+
+class WizardStepStates(Mapping):
+    """
+    Read-only view of the states of a wizard's steps, which are stored by
+    step number only, allowing them to be looked up by step (schema) name
+    as well.  ``step_indexes`` maps step names to step numbers.
+    """
+    def __init__(self, states, step_indexes):
+        self.states = states
+        self.step_indexes = step_indexes
+
+    def __getitem__(self, key):
+        if key in self.states:
+            return self.states[key]
+        num = self.step_indexes.get(key)
+        if num is None or num not in self.states:
+            raise KeyError(key)
+        return self.states[num]
+
+    def __iter__(self):
+        for num in self.states:
+            yield num
+        for name, num in self.step_indexes.items():
+            if num in self.states:
+                yield name
+
+    def __len__(self):
+        return len(list(iter(self)))
+
 class WizardState(object):
-    def __init__(self, request, wizard_name):
+    """
+    State of a wizard for the current request.
+
+    The wizard's data is loaded from its ``store`` (by default, the
+    :class:`IWizardStateStore` registered by :func:`includeme` or else a
+    :class:`SessionWizardStateStore`) once; changes are made in memory and
+    saved to the store once, either by :meth:`flush` or, failing that, when
+    the response is created.
+    """
+    def __init__(self, request, wizard_name, step_names=(), store=None):
         self.wizard_name = wizard_name
         self.request = request
+        if store is None:
+            store = getattr(request.registry, 'pyramid_deform_wizard_store',
+                            _session_store)
+        self.store = store
+        self.step_indexes = dict(
+            (name, num) for num, name in enumerate(step_names))
+        self.dirty = False
+        self._wizdata = None
+        self._states = None
+        self._step_param_applied = False
 
     def _get_wizard_data(self):
-        session = self.request.session
-        wizdatas = session.setdefault('pyramid_deform.wizards', {})
-        wizdata = wizdatas.get(self.wizard_name, None)
-        if wizdata is None:
-            wizdata = {}
-            wizdatas[self.wizard_name] = wizdata
-            session.changed()
-        return wizdata
+        if self._wizdata is None:
+            self._wizdata = self.store.load(self.request, self.wizard_name)
+        return self._wizdata
+
+    def _changed(self):
+        if not self.dirty:
+            self.dirty = True
+            self.request.add_response_callback(
+                lambda request, response: self.flush())
+
+    def flush(self):
+        """
+        Save the state to the store if it was modified since the last
+        flush.
+        """
+        if self.dirty:
+            self.dirty = False
+            self.store.save(self.request, self.wizard_name,
+                            self._get_wizard_data())
 
     def clear(self):
         wizdata = self._get_wizard_data()
         wizdata.clear()
-        self.request.session.changed()
+        self._states = None
+        self._changed()
 
     def get_step_num(self):
         step = self.request.GET.get('step')
-        if step is not None:
+        if step is not None and not self._step_param_applied:
+            # the step requested is only applied once per request, so the
+            # state can move on to another step during the request
+            self._step_param_applied = True
             step = int(step)
             self.set_step_num(step)
         else:
@@ -208,26 +1331,44 @@ class WizardState(object):
 
     def set_step_num(self, num):
         wizdata = self._get_wizard_data()
-        wizdata['step'] = num
-        self.request.session.changed()
+        if wizdata.get('step') != num:
+            wizdata['step'] = num
+            self._changed()
+
+    def _get_states(self):
+        if self._states is None:
+            wizdata = self._get_wizard_data()
+            states = wizdata.setdefault('states', {})
+            for key in list(states):
+                if isinstance(key, integer_types):
+                    continue
+                if isinstance(key, string_types) and key.isdigit():
+                    # JSON session serializers turn the numbers into strings
+                    states.setdefault(int(key), states.pop(key))
+                elif key in self.step_indexes:
+                    # states were once stored under both the step number and
+                    # name
+                    states.setdefault(self.step_indexes[key],
+                                      states.pop(key))
+                    self._changed()
+            self._states = states
+        return self._states
 
     def get_step_states(self):
-        wizdata = self._get_wizard_data()
-        states = wizdata.setdefault('states', {})
-        return states
+        return WizardStepStates(self._get_states(), self.step_indexes)
 
     def get_step_state(self, default=None):
         if default is None:
             default = {}
-        states = self.get_step_states()
+        states = self._get_states()
         step = self.get_step_num()
         return states.get(step, default)
 
     def set_step_state(self, num, name, state):
-        states = self.get_step_states()
+        states = self._get_states()
         states[num] = state
-        states[name] = state
-        self.request.session.changed()
+        self.step_indexes.setdefault(name, num)
+        self._changed()
 
     def decrement_step(self):
         step = self.get_step_num()
@@ -242,18 +1383,71 @@ class WizardState(object):
         step = self.get_step_num()
         self.set_step_state(step, name, state)
 
+_render_step = object()
+
+def make_step_buttons(step, count):
+    """
+    Return the buttons of step number ``step`` of a wizard with ``count``
+    steps, as a ``dict`` mapping each ``(prev_disabled, next_disabled)``
+    pair of booleans to a tuple of buttons.
+    """
+    Button = deform.form.Button
+    result = {}
+    for prev_disabled in (False, True):
+        for next_disabled in (False, True):
+            buttons = []
+            if step > 0:
+                buttons.append(Button(name='previous', title='Previous',
+                                      disabled=prev_disabled))
+            if step < count-1:
+                buttons.append(Button(name='next', title='Next',
+                                      disabled=next_disabled))
+            else:
+                buttons.append(Button(name='next', title='Done',
+                                      disabled=next_disabled))
+            result[(prev_disabled, next_disabled)] = tuple(buttons)
+    return result
+
 class FormWizardView(object):
 
     form_view_class = FormView
     wizard_state_class = WizardState
     schema = None
+    incremental_bind = False
+
+    #: If true, the form of each step is built once per process and
+    #: copied for each request (see :attr:`FormView.cache_forms`).  The
+    #: unbound step schema is then available as :attr:`schema`.
+    cache_forms = False
+
+    #: If true, moving to another step renders that step's form in the
+    #: response to the ``POST`` instead of redirecting to it.  Completing
+    #: the last step still redirects, so ``done`` is called on a ``GET``.
+    direct_render = False
 
     def __init__(self, wizard):
         self.wizard = wizard
 
     def __call__(self, request):
         self.request = request
-        self.wizard_state = self.wizard_state_class(request, self.wizard.name)
+        step_names = getattr(self.wizard, 'step_names', None)
+        if step_names is None:
+            step_names = [schema.name for schema in self.wizard.schemas]
+        self.wizard_state = self.wizard_state_class(
+            request, self.wizard.name, step_names=step_names)
+        result = self.view_step()
+        if result is _render_step:
+            result = self.view_step(submitted=False)
+        self.wizard_state.flush()
+        return result
+
+    def view_step(self, submitted=True):
+        """
+        Return the result of the form view of the current step, or of the
+        wizard's ``done`` callable if all steps are complete.  If
+        ``submitted`` is false, the request's ``POST`` data is ignored.
+        """
+        request = self.request
         step = self.wizard_state.get_step_num()
         
         if step > len(self.wizard.schemas)-1:
@@ -263,10 +1457,16 @@ class FormWizardView(object):
             return result
         form_view = self.form_view_class(request)
         schema = self.wizard.schemas[step]
-        self.schema = schema.bind(request=request)
+        if self.cache_forms:
+            # the form view binds the schema itself and caches its form
+            self.schema = schema
+            form_view.cache_forms = True
+        elif self.incremental_bind:
+            self.schema = bind_schema(schema, request=request)
+        else:
+            self.schema = schema.bind(request=request)
+        form_view.incremental_bind = self.incremental_bind
         form_view.schema = self.schema
-        buttons = []
-
         prev_disabled = False
         next_disabled = False
 
@@ -276,20 +1476,12 @@ class FormWizardView(object):
         if hasattr(schema, 'next_ok'):
             next_disabled = not schema.next_ok(request)
 
-        prev_button = Button(name='previous', title='Previous',
-                             disabled=prev_disabled)
-        next_button = Button(name='next', title='Next',
-                             disabled=next_disabled)
-        done_button = Button(name='next', title='Done',
-                             disabled=next_disabled)
-
-        if step > 0:
-            buttons.append(prev_button)
-
-        if step < len(self.wizard.schemas)-1:
-            buttons.append(next_button)
+        step_buttons = getattr(self.wizard, 'step_buttons', None)
+        if step_buttons is None:
+            buttons = make_step_buttons(step, len(self.wizard.schemas))
         else:
-            buttons.append(done_button)
+            buttons = step_buttons[step]
+        buttons = buttons[(prev_disabled, next_disabled)]
 
         form_view.buttons = buttons
         form_view.next_success = self.next_success
@@ -297,9 +1489,33 @@ class FormWizardView(object):
         form_view.previous_failure = self.previous_failure
         form_view.show = self.show
         form_view.appstruct = getattr(schema, 'appstruct', None)
+        if self.direct_render:
+            # the page may have been requested with a ?step= parameter
+            form_view.form_options = tuple(form_view.form_options) + (
+                ('action', request.path_url),)
+        if not submitted:
+            form_view.submitted = lambda form: None
         result = form_view()
         return result
 
+    def step_changed(self):
+        """
+        Return the response to a successful move to another step: a
+        redirect to the wizard, or a marker telling :meth:`__call__` to
+        render the new step if :attr:`direct_render` is true.
+        """
+        if (self.direct_render and
+            self.wizard_state.get_step_num() < len(self.wizard.schemas)):
+            return _render_step
+        return HTTPFound(location = self.request.path_url)
+
+    def get_summary(self):
+        """
+        Return the wizard's summary (see :meth:`FormWizard.get_summary`)
+        using the wizard state already loaded for the current request.
+        """
+        return self.wizard.get_summary(self.request, self.wizard_state)
+
     def get_schema_serializer(self):
         serializer = getattr(self.schema, 'wizard_serializer', None)
         if serializer is not None:
@@ -329,17 +1545,17 @@ class FormWizardView(object):
         validated = self.serialize(validated)
         self.wizard_state.set_state(self.schema.name, validated)
         self.wizard_state.increment_step()
-        return HTTPFound(location = self.request.path_url)
+        return self.step_changed()
 
     def previous_success(self, validated):
         validated = self.serialize(validated)
         self.wizard_state.set_state(self.schema.name, validated)
         self.wizard_state.decrement_step()
-        return HTTPFound(location = self.request.path_url)
+        return self.step_changed()
 
     def previous_failure(self, e):
         self.wizard_state.decrement_step()
-        return HTTPFound(location = self.request.path_url)
+        return self.step_changed()
 
 class FormWizard(object):
     form_wizard_view_class = FormWizardView # for testing
@@ -349,176 +1565,219 @@ class FormWizard(object):
         self.name = name
         self.done = done
         self.schemas = schemas
+        self.step_names = tuple(schema.name for schema in schemas)
+        self.step_buttons = [make_step_buttons(num, len(schemas))
+                             for num in range(len(schemas))]
+        self.summary = self._make_summary()
 
     def __call__(self, request):
         view = self.form_wizard_view_class(self)
         result = view(request)
         return result
 
-    def get_summary(self, request):
-        result = []
-        state = WizardState(request, self.name)
-        step = state.get_step_num()
+    def _make_summary(self):
+        summary = []
         last = len(self.schemas) - 1
         for num, schema in enumerate(self.schemas):
             classes = []
             is_first = num == 0
             is_last = num == last
-            is_current = num == step
             if is_first:
                 classes.append('first')
             if is_last:
                 classes.append('last')
-            if is_current:
-                classes.append('hilight')
-            result.append({
+            item = {
                 'num':num,
                 'name':schema.name,
                 'title':schema.title,
                 'desc':schema.description,
-                'current':step == num,
-                'url':request.path_url + '?step=%s' % num,
                 'first':is_first,
                 'last':is_last,
-                'class':' '.join(classes),
-                })
-        return result
-
-@colander.deferred
-def deferred_csrf_value(node, kw):
-    return kw['request'].session.get_csrf_token()
+                }
+            summary.append((item, '?step=%s' % num, ' '.join(classes),
+                            ' '.join(classes + ['hilight'])))
+        return summary
 
-@colander.deferred
-def deferred_csrf_validator(node, kw):
-    def csrf_validate(node, value):
-        if value != kw['request'].session.get_csrf_token():
-            raise colander.Invalid(node,
-                                   _('Invalid cross-site scripting token'))
-    return csrf_validate
+    def get_summary(self, request, state=None):
+        """
+        Return a list of ``dict`` structures describing the steps of the
+        wizard, e.g. for a sidebar.  Everything but the ``current`` flag,
+        the ``hilight`` class and the base of each step's ``url`` is
+        computed once per wizard.  ``state`` may be the
+        :class:`WizardState` already used for ``request`` (see
+        :meth:`FormWizardView.get_summary`), to avoid loading it again.
+        """
+        if state is None:
+            state = self.wizard_state_class(request, self.name,
+                                            step_names=self.step_names)
+        step = state.get_step_num()
+        path_url = request.path_url
+        result = []
+        for item, query, classes, current_classes in self.summary:
+            item = item.copy()
+            is_current = item['num'] == step
+            item['current'] = is_current
+            item['url'] = path_url + query
+            item['class'] = current_classes if is_current else classes
+            result.append(item)
+        return result
 
-class CSRFSchema(colander.Schema):
+class TranslationCache(object):
     """
-    Schema base class which generates and validates a CSRF token
-    automatically.  You must use it like so:
-
-    .. code-block:: python
-
-      from pyramid_deform import CSRFSchema
-      import colander
+    A thread-safe LRU cache of the strings translated by
+    :func:`translator`, keeping the ``maxsize`` most recently used;
+    ``hits`` and ``misses`` count lookups.
+    """
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            translated = self.entries.pop(key, None)
+            if translated is None:
+                self.misses += 1
+            else:
+                self.entries[key] = translated
+                self.hits += 1
+            return translated
+
+    def set(self, key, translated):
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = translated
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
 
-      class MySchema(CSRFSchema):
-          my_value = colander.SchemaNode(colander.String())
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
 
-      And in your application code, *bind* the schema, passing the request
-      as a keyword argument:
+#: The :class:`TranslationCache` of the strings translated by
+#: :func:`translator`, keyed by localizer (applications may have several,
+#: one per registry), locale, domain, context, message id, default and
+#: mapping.  Its size is set by the ``pyramid_deform.translation_cache_size``
+#: setting.
+translation_cache = TranslationCache()
 
-      .. code-block:: python
+# unlike id(), serials are never reused by another localizer
+_localizer_serials = weakref.WeakKeyDictionary()
+_localizer_count = itertools.count()
 
-        def aview(request):
-            schema = MySchema().bind(request=request)
+_untranslated_localizers = weakref.WeakKeyDictionary()
 
-      In order for the CRSFSchema to work, you must configure a *session
-      factory* in your Pyramid application.
+def untranslated(localizer):
     """
-    csrf_token = colander.SchemaNode(
-        colander.String(),
-        widget=deform.widget.HiddenWidget(),
-        default=deferred_csrf_value,
-        validator=deferred_csrf_validator,
-        )
+    Return true if the Pyramid ``localizer`` has no message catalog at all
+    (as on sites using only the default locale), in which case translating
+    a term only interpolates it.  The result is kept per localizer.
+    """
+    result = _untranslated_localizers.get(localizer)
+    if result is None:
+        translations = localizer.translations
+        result = not (getattr(translations, '_catalog', None) or
+                      getattr(translations, '_domains', None))
+        _untranslated_localizers[localizer] = result
+    return result
 
 def translator(term):
     request = get_current_request()
-    if request is not None:
-        return get_localizer(request).translate(term)
-    else:
+    if request is None:
         return term.interpolate() if hasattr(term, 'interpolate') else term
+    localizer = get_localizer(request)
+    if untranslated(localizer):
+        return term.interpolate() if hasattr(term, 'interpolate') else term
+    mapping = getattr(term, 'mapping', None)
+    try:
+        serial = _localizer_serials.get(localizer)
+        if serial is None:
+            serial = _localizer_serials.setdefault(localizer,
+                                                   next(_localizer_count))
+        key = (serial, localizer.locale_name, getattr(term, 'domain', None),
+               getattr(term, 'context', None), text_type(term),
+               getattr(term, 'default', None),
+               mapping and tuple(sorted(mapping.items())))
+        hash(key)
+    except TypeError:
+        return localizer.translate(term)
+    translated = translation_cache.get(key)
+    if translated is None:
+        translated = localizer.translate(term)
+        translation_cache.set(key, translated)
+    return translated
+
+def template_index(search_path):
+    """
+    Return a ``dict`` mapping the name of each Chameleon template (``.pt``
+    file) found in the ``search_path`` directories, relative to its
+    directory and without extension, to its absolute path.  When several
+    directories hold a template of the same name, the first one wins.
+    """
+    index = {}
+    for directory in search_path:
+        for dirpath, dirnames, filenames in os.walk(directory):
+            for filename in filenames:
+                if filename.endswith('.pt'):
+                    path = os.path.abspath(os.path.join(dirpath, filename))
+                    name = os.path.relpath(path, os.path.abspath(directory))
+                    index.setdefault(name[:-3].replace(os.sep, '/'), path)
+    return index
 
 def configure_zpt_renderer(search_path=()):
+    from pyramid_deform.renderer import IndexedZPTRendererFactory
     default_paths = deform.form.Form.default_renderer.loader.search_path
     paths = []
     for path in search_path:
         pkg, resource_name = path.split(':')
         paths.append(resource_filename(pkg, resource_name))
-    deform.form.Form.default_renderer = deform.ZPTRendererFactory(
-        tuple(paths) + default_paths, translator=translator)
-
-_marker = object()
-
-class SessionFileUploadTempStore(object):
-    def __init__(self, request):
-        try:
-            self.tempdir=request.registry.settings['pyramid_deform.tempdir']
-        except KeyError:
-            raise ConfigurationError(
-                'To use SessionFileUploadTempStore, you must set a  '
-                '"pyramid_deform.tempdir" key in your .ini settings. It '
-                'points to a directory which will temporarily '
-                'hold uploaded files when form validation fails.')
-        self.request = request
-        self.session = request.session
-        self.tempstore = self.session.setdefault('substanced.tempstore', {})
-        
-    def preview_url(self, uid):
-        return None
-
-    def __contains__(self, name):
-        return name in self.tempstore
-
-    def __setitem__(self, name, data):
-        newdata = data.copy()
-        stream = newdata.pop('fp', None)
-
-        if stream is not None:
-            while True:
-                randid = binascii.hexlify(os.urandom(20))
-                if not isinstance(randid, string_types):
-                    randid = randid.decode("ascii")
-                fn = os.path.join(self.tempdir, randid)
-                if not os.path.exists(fn):
-                    # XXX race condition
-                    fp = open(fn, 'w+b')
-                    newdata['randid'] = randid
-                    break
-            for chunk in chunks(stream):
-                fp.write(chunk)
-
-        self.tempstore[name] = newdata
-        self.session.changed()
-
-    def get(self, name, default=None):
-        data = self.tempstore.get(name)
-
-        if data is None:
-            return default
-
-        newdata = data.copy()
-            
-        randid = newdata.get('randid')
-
-        if randid is not None:
-
-            fn = os.path.join(self.tempdir, randid)
-            try:
-                newdata['fp'] = open(fn, 'rb')
-            except IOError:
-                pass
-
-        return newdata
-
-    def __getitem__(self, name):
-        data = self.get(name, _marker)
-        if data is _marker:
-            raise KeyError(name)
-        return data
-
-def chunks(stream, chunk_size=10000):
-    while True:
-        chunk = stream.read(chunk_size)
-        if not chunk:
-            break
-        yield chunk
+    deform.form.Form.default_renderer = IndexedZPTRendererFactory(
+        tuple(paths) + tuple(default_paths), translator=translator)
 
+def warm_templates(renderer=None):
+    """
+    Load and compile each Chameleon template (``.pt`` file) found in the
+    search path of ``renderer``, a ``deform.ZPTRendererFactory`` (by default
+    Deform's default renderer), under the name Deform's widgets load it by,
+    so that the first requests do not have to.  Returns the number of
+    templates compiled.
+
+    Called by :func:`includeme` when ``pyramid_deform.warm_templates`` is
+    true; when the application is loaded before the server forks its
+    workers, they share the compiled templates.
+    """
+    if renderer is None:
+        renderer = deform.form.Form.default_renderer
+    names = getattr(renderer, 'index', None)
+    if names is None:
+        names = template_index(renderer.loader.search_path)
+    for name in sorted(names):
+        renderer.load(name).cook_check()
+    return len(names)
+
+def check_form_views(introspector):
+    """
+    Raise a :exc:`pyramid.exceptions.ConfigurationError` if a
+    :class:`FormView` subclass registered as a view has a button without a
+    matching ``<name>_success`` method on its class.  Run by
+    :func:`includeme` when ``pyramid_deform.check_buttons`` is true.
+    """
+    for intr in introspector.get_category('views') or ():
+        view = intr['introspectable']['callable']
+        if not (isinstance(view, class_types) and
+                issubclass(view, FormView)):
+            continue
+        names, handlers = _dispatch_table(view, view.buttons)
+        for name in sorted(names):
+            success_name = handlers[name][0]
+            if not hasattr(view, success_name):
+                raise ConfigurationError(
+                    'The %r button of %s.%s has no %s method.' % (
+                        name, view.__module__, view.__name__, success_name))
 
 def includeme(config):
     """ Provide useful configuration to a Pyramid ``Configurator`` instance.
@@ -530,6 +1789,43 @@ def includeme(config):
     template search path (if one is specified by
     ``pyramid_deform.template_search_path`` in your Pyramid
     configuration).
+
+    If ``pyramid_deform.warm_templates`` is true, every template of the
+    search path is compiled at once (see :func:`warm_templates`).
+
+    ``pyramid_deform.translation_cache_size`` sets the number of translated
+    strings kept in :data:`translation_cache` (10000 by default).
+
+    If ``pyramid_deform.bundle_dir`` is set, an :class:`AssetBundler`
+    writing to that directory is registered and its bundles are served,
+    with far-future cache headers, under ``pyramid_deform.bundle_path``
+    (``static-deform-bundles`` by default).
+
+    ``pyramid_deform.wizard_state_store`` selects where wizard state is
+    kept: ``session`` (the default), ``memory`` (see
+    :class:`MemoryWizardStateStore`), ``file`` (see
+    :class:`FileWizardStateStore`, which requires
+    ``pyramid_deform.wizard_state_dir``) or the dotted name of a callable
+    accepting the settings and returning an :class:`IWizardStateStore`.
+    ``pyramid_deform.wizard_state_ttl`` sets the lifetime, in seconds, of
+    state in the memory and file stores.
+
+    If ``pyramid_deform.precompress`` is true, Deform's static files are
+    mirrored with compressed siblings (see :func:`precompress_static`) into
+    the ``pyramid_deform.precompress_dir`` directory, which then overrides
+    the ``deform:static`` asset specification, choosing the encoding from
+    the request's ``Accept-Encoding`` header.  Bundles are compressed too.
+    This requires Pyramid 1.10 or better.
+
+    If ``pyramid_deform.tempstore_ttl`` or
+    ``pyramid_deform.tempstore_max_bytes`` is set, a
+    :class:`TempstoreReaper` cleaning ``pyramid_deform.tempdir`` up is
+    registered (see :func:`tempstore_reaper`).
+
+    If ``pyramid_deform.check_buttons`` is true, the buttons of the
+    :class:`FormView` subclasses registered as views are checked once the
+    configuration is committed (see :func:`check_form_views`).  Views which
+    assign their ``*_success`` methods per instance fail this check.
     """
     settings = config.registry.settings
     search_path = settings.get(
@@ -538,6 +1834,132 @@ def includeme(config):
     config.add_translation_dirs('colander:locale', 'deform:locale')
     static_path = settings.get(
         'pyramid_deform.static_path', 'static-deform').strip()
-    config.add_static_view(static_path, 'deform:static')
+    encodings = ()
+    if asbool(settings.get('pyramid_deform.precompress', False)):
+        try:
+            precompress_dir = settings['pyramid_deform.precompress_dir']
+        except KeyError:
+            raise ConfigurationError(
+                'To use pyramid_deform.precompress, you must set a '
+                '"pyramid_deform.precompress_dir" key in your .ini settings. '
+                'It points to a directory which will hold the compressed '
+                'Deform static files.')
+        precompress_dir = os.path.abspath(precompress_dir.strip())
+        encodings = precompress_static(resource_filename('deform', 'static'),
+                                       precompress_dir)
+        # deform:static stays the asset spec of the view, for static_url
+        config.add_static_view(static_path, 'deform:static',
+                               content_encodings=encodings)
+        config.override_asset('deform:static/',
+                              os.path.join(precompress_dir, ''))
+    else:
+        config.add_static_view(static_path, 'deform:static')
+
+    bundle_dir = settings.get('pyramid_deform.bundle_dir', '').strip()
+    if bundle_dir:
+        # an absolute path, which static_url accepts for the bundles
+        bundle_dir = os.path.abspath(bundle_dir)
+        bundle_path = settings.get(
+            'pyramid_deform.bundle_path', 'static-deform-bundles').strip()
+        kw = {'cache_max_age': 365*24*60*60}
+        if encodings:
+            kw['content_encodings'] = encodings
+        config.add_static_view(bundle_path, bundle_dir, **kw)
+        if '://' in static_path:
+            static_prefix = static_path.rstrip('/') + '/'
+        else:
+            depth = bundle_path.strip('/').count('/') + 1
+            static_prefix = '../' * depth + static_path.strip('/') + '/'
+        bundler = AssetBundler(bundle_dir, static_prefix)
+        bundler.encodings = encodings
+        config.registry.pyramid_deform_bundler = bundler
+        config.action(
+            None,
+            lambda: bundle_form_views(config.introspector, bundler),
+            order=1)
+
+    if asbool(settings.get('pyramid_deform.check_buttons', False)):
+        config.action(None, lambda: check_form_views(config.introspector),
+                      order=1)
+
+    store = settings.get('pyramid_deform.wizard_state_store', '').strip()
+    if store and store != 'session':
+        ttl = int(settings.get('pyramid_deform.wizard_state_ttl', 3600))
+        if store == 'memory':
+            store = MemoryWizardStateStore(ttl=ttl)
+        elif store == 'file':
+            try:
+                directory = settings['pyramid_deform.wizard_state_dir']
+            except KeyError:
+                raise ConfigurationError(
+                    'To use the file wizard state store, you must set a '
+                    '"pyramid_deform.wizard_state_dir" key in your .ini '
+                    'settings. It points to a directory which will hold '
+                    'the state of wizards in progress.')
+            store = FileWizardStateStore(directory.strip(), ttl=ttl)
+        else:
+            store = config.maybe_dotted(store)(settings)
+        config.registry.pyramid_deform_wizard_store = store
+
+    reaper = tempstore_reaper(settings)
+    if reaper is not None:
+        config.registry.pyramid_deform_tempstore_reaper = reaper
+
+    cache_size = settings.get('pyramid_deform.translation_cache_size')
+    if cache_size:
+        translation_cache.maxsize = int(cache_size)
 
     configure_zpt_renderer(search_path.split())
+    if asbool(settings.get('pyramid_deform.warm_templates', False)):
+        warm_templates()
+
+# defined in submodules, which import this module
+from pyramid_deform.wizardstore import IWizardStateStore
+from pyramid_deform.wizardstore import SessionWizardStateStore
+from pyramid_deform.wizardstore import MemoryWizardStateStore
+from pyramid_deform.wizardstore import FileWizardStateStore
+from pyramid_deform.wizardstore import wizard_token
+from pyramid_deform.wizardstore import _session_store
+from pyramid_deform.tempstore import SessionFileUploadTempStore
+from pyramid_deform.tempstore import TempstoreReaper
+from pyramid_deform.tempstore import chunks
+from pyramid_deform.tempstore import copy_stream
+from pyramid_deform.tempstore import linkable_path
+from pyramid_deform.tempstore import reap_tempstore
+from pyramid_deform.tempstore import tempstore_chunk_size
+from pyramid_deform.tempstore import tempstore_executor
+from pyramid_deform.tempstore import tempstore_reaper
+from pyramid_deform.assets import AssetBundler
+from pyramid_deform.assets import available_encodings
+from pyramid_deform.assets import bundle_form_views
+from pyramid_deform.assets import compressible_extensions
+from pyramid_deform.assets import precompress_file
+from pyramid_deform.assets import precompress_static
+
+# names of the attributes of this package which import Colander and
+# Deform, with the module defining each
+_lazy_attributes = {
+    'Button': 'deform.form',
+    'CSRFSchema': 'pyramid_deform.csrf',
+    'deferred_csrf_value': 'pyramid_deform.csrf',
+    'deferred_csrf_validator': 'pyramid_deform.csrf',
+    'IndexedZPTRendererFactory': 'pyramid_deform.renderer',
+    }
+
+def __getattr__(name):
+    """
+    Import the attributes listed in ``_lazy_attributes`` on first use
+    (:pep:`562`), so that importing :mod:`pyramid_deform` does not import
+    Colander and Deform.
+    """
+    module = _lazy_attributes.get(name)
+    if module is None:
+        raise AttributeError(
+            'module %r has no attribute %r' % (__name__, name))
+    value = globals()[name] = getattr(import_module(module), name)
+    return value
+
+if sys.version_info < (3, 7): # pragma: no cover
+    # no module __getattr__ before Python 3.7
+    for name in _lazy_attributes:
+        __getattr__(name)
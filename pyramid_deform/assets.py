@@ -0,0 +1,208 @@
+""" Bundling and precompression of Deform's static assets. """
+import binascii
+import gzip
+import hashlib
+import io
+import os
+import posixpath
+import re
+import shutil
+import warnings
+
+try:
+    import brotli
+except ImportError: # pragma: no cover
+    brotli = None
+
+from pyramid_deform import FormView
+from pyramid_deform import class_types
+from pyramid_deform import resource_filename
+
+_css_url = re.compile(br'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+class AssetBundler(object):
+    """
+    Concatenates the ``deform:static`` widget resources of a form into a
+    single file per resource type, named after a hash of its content and
+    written to ``directory``.  Relative ``url()`` references in bundled CSS
+    are rewritten to start with ``static_prefix``, the URL (usually relative
+    to the bundle) of the ``deform:static`` view.
+
+    :func:`includeme` creates one when ``pyramid_deform.bundle_dir`` is set;
+    :class:`FormView` then returns the bundle's path in place of the
+    individual links.  Deform releases before 2.0 name resources relative to
+    ``deform:static``; such names are never bundled, and a warning says so.
+    """
+    #: Resource specifications starting with one of these prefixes are
+    #: never bundled (TinyMCE loads its plugins relative to its own URL).
+    unbundled = ('deform:static/tinymce/',)
+
+    #: Content encodings (see :func:`precompress_file`) written next to
+    #: each bundle.
+    encodings = ()
+
+    def __init__(self, directory, static_prefix):
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.directory = directory
+        self.static_prefix = static_prefix
+        self.bundles = {}
+
+    def bundleable(self, spec):
+        return (spec.startswith('deform:static/') and
+                not spec.startswith(self.unbundled))
+
+    def bundle(self, resources, kind):
+        """
+        Return ``resources`` (a sequence of asset specifications of type
+        ``kind``, either ``js`` or ``css``) with the bundleable ones replaced
+        by the absolute path of their bundle, which takes the place of the
+        first of them.  Results are memoized.
+        """
+        key = (kind, tuple(resources))
+        result = self.bundles.get(key)
+        if result is None:
+            if any(':' not in spec and not os.path.isabs(spec)
+                   for spec in resources):
+                warnings.warn(
+                    'pyramid_deform.bundle_dir: relative widget resource '
+                    'names (from Deform < 2.0) are not bundled')
+            bundled = [spec for spec in resources if self.bundleable(spec)]
+            if len(bundled) < 2:
+                result = tuple(resources)
+            else:
+                path = self.write(bundled, kind)
+                result = []
+                for spec in resources:
+                    if spec not in bundled:
+                        result.append(spec)
+                    elif path not in result:
+                        result.append(path)
+                result = tuple(result)
+            self.bundles[key] = result
+        return result
+
+    def write(self, specs, kind):
+        separator = b';\n' if kind == 'js' else b'\n'
+        content = separator.join([self.read(spec, kind) for spec in specs])
+        name = '%s.%s' % (hashlib.sha1(content).hexdigest()[:16], kind)
+        path = os.path.join(self.directory, name)
+        if not os.path.exists(path):
+            temp = '%s.%s' % (path, binascii.hexlify(os.urandom(4)).decode())
+            with open(temp, 'wb') as f:
+                f.write(content)
+            os.rename(temp, path)
+            precompress_file(path, self.encodings)
+        return path
+
+    def read(self, spec, kind):
+        pkg, name = spec.split(':', 1)
+        with open(resource_filename(pkg, name), 'rb') as f:
+            data = f.read()
+        if kind == 'css':
+            data = self.rewrite_css(data, name.split('/', 1)[1])
+        return data
+
+    def rewrite_css(self, data, name):
+        """
+        Rewrite the relative ``url()`` references of the stylesheet
+        ``data``, found at ``name`` within ``deform:static``.
+        """
+        base = posixpath.dirname(name)
+        prefix = self.static_prefix.encode('utf-8')
+        def replace(match):
+            url = match.group(2).strip()
+            if url.startswith((b'/', b'#')) or b':' in url:
+                return match.group(0)
+            url = posixpath.normpath(
+                posixpath.join(base.encode('utf-8'), url))
+            return b'url(' + prefix + url + b')'
+        return _css_url.sub(replace, data)
+
+def bundle_form_views(introspector, bundler):
+    """
+    Bundle the widget resources of every :class:`FormView` subclass
+    registered as a view, so that the bundles exist before the first
+    request.
+    """
+    for intr in introspector.get_category('views') or ():
+        view = intr['introspectable']['callable']
+        if not (isinstance(view, class_types) and
+                issubclass(view, FormView) and view.schema is not None):
+            continue
+        try:
+            reqts = view.form_class(view.schema).get_widget_resources()
+        except Exception:
+            # schemas which cannot be used unbound (e.g. with deferred
+            # widgets) are bundled on first use instead
+            continue
+        bundler.bundle(reqts['js'], 'js')
+        bundler.bundle(reqts['css'], 'css')
+
+#: Extensions of the files compressed by :func:`precompress_static`.
+compressible_extensions = ('.css', '.js', '.json', '.map', '.svg', '.html',
+                           '.txt', '.xml', '.eot', '.ttf')
+
+def _gzip(data):
+    buf = io.BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode='wb', compresslevel=9, mtime=0) as f:
+        f.write(data)
+    return buf.getvalue()
+
+_compressors = {'gzip': ('.gz', _gzip)}
+if brotli is not None: # pragma: no cover
+    _compressors['br'] = ('.br', brotli.compress)
+
+def available_encodings():
+    """
+    Return the content encodings :func:`precompress_file` can write:
+    ``gzip`` and, if the ``brotli`` package is installed, ``br``.
+    """
+    return tuple(e for e in ('br', 'gzip') if e in _compressors)
+
+def precompress_file(path, encodings):
+    """
+    Write a compressed sibling of the file at ``path`` (e.g. ``path.gz``)
+    for each of ``encodings``, unless an up-to-date one exists or
+    compression would not make the file smaller.
+    """
+    data = None
+    for encoding in encodings:
+        extension, compress = _compressors[encoding]
+        target = path + extension
+        if (os.path.exists(target) and
+            os.path.getmtime(target) >= os.path.getmtime(path)):
+            continue
+        if data is None:
+            with open(path, 'rb') as f:
+                data = f.read()
+        compressed = compress(data)
+        if len(compressed) < len(data):
+            temp = '%s.%s' % (target, binascii.hexlify(os.urandom(4)).decode())
+            with open(temp, 'wb') as f:
+                f.write(compressed)
+            os.rename(temp, target)
+
+def precompress_static(source, directory, encodings=None):
+    """
+    Mirror the ``source`` directory into ``directory``, writing compressed
+    siblings of the files whose extension is one of
+    :data:`compressible_extensions`.  Files which are already up to date
+    are left alone, so only the first startup pays for the compression.
+    Returns the encodings written (by default, :func:`available_encodings`).
+    """
+    if encodings is None:
+        encodings = available_encodings()
+    for dirpath, dirnames, filenames in os.walk(source):
+        target_dir = os.path.join(directory, os.path.relpath(dirpath, source))
+        if not os.path.isdir(target_dir):
+            os.makedirs(target_dir)
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            target = os.path.join(target_dir, filename)
+            if (not os.path.exists(target) or
+                os.path.getmtime(target) < os.path.getmtime(path)):
+                shutil.copy2(path, target)
+            if filename.endswith(compressible_extensions):
+                precompress_file(target, encodings)
+    return encodings
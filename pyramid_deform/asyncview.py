@@ -0,0 +1,217 @@
+"""
+An asyncio flavour of :class:`pyramid_deform.FormView` (Python 3.5+).
+
+Pyramid never awaits what a view returns, so views returning coroutines
+need a view mapper which runs them.  Pyramid's router is synchronous: the
+thread serving the request waits for the coroutine whichever way it is
+run, so it is not released for other requests.  What an async view buys is
+running several I/O bound steps (coroutine handlers, concurrent validators)
+at once.  A mapper can run the coroutines on one event loop shared by the
+whole process rather than create a loop per request::
+
+  import asyncio
+  import threading
+  from pyramid.config.views import DefaultViewMapper
+
+  loop = asyncio.new_event_loop()
+  threading.Thread(target=loop.run_forever, daemon=True).start()
+
+  class AsyncViewMapper(DefaultViewMapper):
+      def __call__(self, view):
+          mapped = super(AsyncViewMapper, self).__call__(view)
+          def run(context, request):
+              coroutine = mapped(context, request)
+              future = asyncio.run_coroutine_threadsafe(coroutine, loop)
+              return future.result()
+          return run
+
+  config.add_view(PageEditView, name='edit', renderer='templates/form.pt',
+                  mapper=AsyncViewMapper)
+
+Its validators and templates still run in :attr:`AsyncFormView.executor`
+(by default the pool returned by :func:`default_executor`, shared by all
+loops) and concurrent coroutine validators are gathered on the loop.
+"""
+import asyncio
+import inspect
+import threading
+
+import colander
+import deform.exception
+
+from pyramid.threadlocal import manager
+
+from pyramid_deform import FormView
+from pyramid_deform import find_concurrent_validators
+from pyramid_deform import find_concurrent_validators_in_failure
+from pyramid_deform import raise_validation_failure
+
+# asyncio.get_running_loop is new in Python 3.7
+get_running_loop = getattr(asyncio, 'get_running_loop',
+                           asyncio.get_event_loop)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def default_executor():
+    """
+    Return the thread pool (created on first use, with the default number
+    of workers of :class:`concurrent.futures.ThreadPoolExecutor`) which
+    validates and renders forms unless :attr:`AsyncFormView.executor` says
+    otherwise.  It is shared by all event loops.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            _executor = ThreadPoolExecutor()
+    return _executor
+
+
+async def maybe_await(value):
+    """ Return ``value``, awaiting it first if it is awaitable. """
+    if inspect.isawaitable(value):
+        value = await value
+    return value
+
+
+class AsyncFormView(FormView):
+    """
+    A :class:`pyramid_deform.FormView` whose :meth:`__call__` is a
+    coroutine, for Pyramid applications served through an ASGI bridge.
+
+    :meth:`get_bind_data`, :meth:`appstruct`, :meth:`show`,
+    :meth:`failure` and the ``*_success`` and ``*_failure`` methods may be
+    coroutines (or return other awaitables); their results are awaited.
+    Validating and rendering the form happen in :attr:`executor` so the
+    event loop is not blocked meanwhile.
+    """
+    #: The :class:`concurrent.futures.Executor` used to validate and render
+    #: forms.  ``None`` means :func:`default_executor`.
+    executor = None
+
+    async def __call__(self):
+        """
+        Coroutine version of :meth:`pyramid_deform.FormView.__call__`.
+        """
+        if self.csrf and self.request.method == 'POST':
+            self.check_csrf()
+        bind_data = await maybe_await(self.get_bind_data())
+        form = self._make_form(bind_data)
+        self.before(form)
+        reqts = self._get_resources(form)
+        result = None
+
+        button = self.submitted(form)
+        if button is not None:
+            success_method, fail = self.handlers(form, button)
+            try:
+                validated = await self.validate(form, self.controls())
+                result = await maybe_await(success_method(validated))
+            except deform.exception.ValidationFailure as e:
+                result = await maybe_await(fail(e))
+
+        if result is None:
+            result = await maybe_await(self.show(form))
+
+        if isinstance(result, dict):
+            result['js_links'] = reqts['js']
+            result['css_links'] = reqts['css']
+
+        return result
+
+    async def validate(self, form, controls):
+        """
+        Coroutine version of :meth:`pyramid_deform.FormView.validate`.
+        Concurrent validators which are coroutine functions are gathered on
+        the event loop; the others run in :attr:`executor`.
+        """
+        try:
+            validated = await self.run_in_executor(form.validate, controls)
+        except deform.exception.ValidationFailure as e:
+            errors = await self.run_validators(
+                find_concurrent_validators_in_failure(form.schema,
+                                                      e.cstruct, e.error))
+            if errors:
+                raise_validation_failure(form, errors, e.error)
+            raise
+        errors = await self.run_validators(
+            find_concurrent_validators(form.schema, validated))
+        if errors:
+            raise_validation_failure(form, errors)
+        return validated
+
+    async def run_validators(self, checks):
+        """
+        Run the validators of ``checks`` concurrently and return a list of
+        ``(path, error)`` tuples for those which failed.
+        """
+        checks = list(checks)
+        results = await asyncio.gather(
+            *[self.call_validator(node, value)
+              for path, node, value in checks])
+        return [(check[0], error) for check, error in zip(checks, results)
+                if error is not None]
+
+    async def call_validator(self, node, value):
+        """
+        Run the ``concurrent_validator`` of ``node`` with ``value`` and
+        return the ``colander.Invalid`` it raised, if any.
+        """
+        validator = node.concurrent_validator
+        try:
+            if asyncio.iscoroutinefunction(validator):
+                await validator(node, value)
+            else:
+                await self.run_in_executor(validator, node, value)
+        except colander.Invalid as e:
+            return e
+
+    async def run_in_executor(self, func, *args):
+        """
+        Run ``func(*args)`` in :attr:`executor` and return its result.  The
+        current request and registry are made available to Pyramid's thread
+        locals in the worker thread (the translator used by Deform's
+        templates needs them).
+        """
+        request = self.request
+        def call():
+            manager.push({'request': request,
+                          'registry': request.registry})
+            try:
+                return func(*args)
+            finally:
+                manager.pop()
+        executor = self.executor
+        if executor is None:
+            executor = default_executor()
+        return await get_running_loop().run_in_executor(executor, call)
+
+    async def failure(self, e):
+        """
+        Coroutine version of :meth:`pyramid_deform.FormView.failure`.
+        """
+        if self.stream:
+            return FormView.failure(self, e)
+        rendered = await self.run_in_executor(e.render)
+        return {
+            'form': self.add_csrf_field(rendered),
+            }
+
+    async def show(self, form):
+        """
+        Coroutine version of :meth:`pyramid_deform.FormView.show`.
+        """
+        appstruct = await maybe_await(self.appstruct())
+        if self.stream:
+            rendered = self.render_stream(form, appstruct)
+        elif self.render_cache is not None and self.render_cacheable():
+            rendered = await self.run_in_executor(self.render_cached, form,
+                                                  appstruct)
+        elif appstruct is None:
+            rendered = await self.run_in_executor(form.render)
+        else:
+            rendered = await self.run_in_executor(form.render, appstruct)
+        return {
+            'form': self.add_csrf_field(rendered),
+            }
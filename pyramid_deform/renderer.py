@@ -0,0 +1,26 @@
+""" The template renderer installed by ``configure_zpt_renderer``. """
+import deform
+
+from pyramid_deform import template_index
+
+class IndexedZPTRendererFactory(deform.ZPTRendererFactory):
+    """
+    A ``deform.ZPTRendererFactory`` which looks templates up in an
+    :attr:`index` of its search path (see :func:`template_index`) built
+    when it is created, instead of trying each directory of the search path
+    in turn.  Templates missing from the index (added later, or given as
+    asset specifications) are looked up as usual.
+    """
+    def __init__(self, search_path, **kw):
+        deform.ZPTRendererFactory.__init__(self, search_path, **kw)
+        #: The template index, mapping names to absolute paths.
+        self.index = template_index(search_path)
+
+    def load(self, template_name):
+        name = template_name
+        if name.endswith('.pt'):
+            name = name[:-3]
+        path = self.index.get(name)
+        if path is None:
+            path = template_name
+        return self.loader.load(path)
@@ -0,0 +1,521 @@
+""" The file upload temporary store of :mod:`pyramid_deform`. """
+import binascii
+import errno
+import os
+import re
+import shutil
+import stat
+import sys
+import threading
+import time
+
+from pyramid.exceptions import ConfigurationError
+from pyramid.settings import asbool
+
+from pyramid_deform import string_types
+
+_marker = object()
+
+#: The default size, in bytes, of the chunks uploads are copied in by
+#: :class:`SessionFileUploadTempStore`.
+tempstore_chunk_size = 1 << 20
+
+def copy_stream(source, out, chunk_size=tempstore_chunk_size):
+    """
+    Copy the rest of the binary file-like object ``source`` to the binary
+    file ``out``.
+
+    When ``source`` is a file with a descriptor (as WebOb's spooled uploads
+    are) the kernel copies the data, with ``os.sendfile``, where available.
+    Otherwise ``source`` is read into a reused buffer of ``chunk_size``
+    bytes, with its ``readinto`` method if it has one.
+    """
+    sendfile = getattr(os, 'sendfile', None)
+    fileno = None
+    if sendfile is not None:
+        try:
+            fileno = source.fileno()
+            offset = source.tell()
+        except (AttributeError, IOError, OSError, ValueError):
+            fileno = None
+    if fileno is not None:
+        out.flush()
+        try:
+            while True:
+                sent = sendfile(out.fileno(), fileno, offset, chunk_size)
+                if not sent:
+                    break
+                offset += sent
+        except OSError:
+            # not supported for these files: copy the rest below
+            pass
+        source.seek(offset)
+    readinto = getattr(source, 'readinto', None)
+    if readinto is None:
+        shutil.copyfileobj(source, out, chunk_size)
+        return
+    buf = bytearray(chunk_size)
+    view = memoryview(buf)
+    while True:
+        size = readinto(buf)
+        if not size:
+            break
+        out.write(view[:size])
+
+def linkable_path(source, directory):
+    """
+    Return the path of the binary file object ``source`` if it can be hard
+    linked into ``directory`` in place of copying its content, else
+    ``None``.
+
+    That is the case when ``source`` is positioned at its start and its
+    ``name`` is the path of the regular file it was opened from (as for
+    ``tempfile.NamedTemporaryFile`` spooled uploads), on the same
+    filesystem as ``directory``.  Anonymous temporary files, like those
+    WebOb spools uploads to by default, have no such path.
+    """
+    if not hasattr(os, 'link'):
+        return None
+    name = getattr(source, 'name', None)
+    if not isinstance(name, string_types):
+        return None
+    try:
+        if source.tell() != 0:
+            return None
+        source.flush()
+        st = os.fstat(source.fileno())
+        named = os.stat(name)
+        target = os.stat(directory)
+    except (AttributeError, IOError, OSError, ValueError):
+        return None
+    if (not stat.S_ISREG(st.st_mode) or
+        (named.st_dev, named.st_ino) != (st.st_dev, st.st_ino) or
+        st.st_dev != target.st_dev):
+        return None
+    return name
+
+def _reopen_stream(stream):
+    """
+    Return a new binary file object reading the file ``stream`` from its
+    current position which stays usable once ``stream`` is closed (WebOb
+    closes uploads with the request), or ``None`` if ``stream`` has no
+    descriptor.
+
+    On Linux the file is opened again through ``/proc/self/fd``, so that
+    reading either object doesn't move the other's position; elsewhere the
+    descriptor is duplicated.
+    """
+    try:
+        offset = stream.tell()
+        fileno = stream.fileno()
+    except (AttributeError, IOError, OSError, ValueError):
+        return None
+    try:
+        reopened = open('/proc/self/fd/%d' % fileno, 'rb')
+    except (IOError, OSError):
+        try:
+            reopened = os.fdopen(os.dup(fileno), 'rb')
+        except OSError:
+            return None
+    reopened.seek(offset)
+    return reopened
+
+_tempstore_executor = None
+_tempstore_lock = threading.Lock()
+_pending_writes = {}
+
+def tempstore_executor():
+    """
+    Return the thread pool (of ``4`` workers, created on first use) which
+    writes uploads to disk for :class:`SessionFileUploadTempStore` when
+    ``pyramid_deform.tempstore_async`` is true.
+    """
+    global _tempstore_executor
+    with _tempstore_lock:
+        if _tempstore_executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            _tempstore_executor = ThreadPoolExecutor(4)
+    return _tempstore_executor
+
+# the names of the files written by SessionFileUploadTempStore
+_tempstore_file = re.compile(r'^[0-9a-f]{40}(\.part|\.failed)?$')
+
+class TempstoreReaper(object):
+    """
+    Removes the files of a :class:`SessionFileUploadTempStore` directory
+    ``ttl`` seconds after they were stored or last read and, when the
+    files take more than ``max_bytes`` bytes, the least recently used ones
+    until they fit, files still being written excepted.  Files not named
+    like those of the temporary store are left alone (and not counted).
+
+    :meth:`reap` does so once; :meth:`start` does so every ``interval``
+    seconds in a daemon thread, which is also woken up whenever a stored
+    file exceeds the quota.
+    """
+    def __init__(self, directory, ttl=86400, max_bytes=None, interval=300):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.interval = interval
+        #: Bytes taken by the files of the directory, as of the last
+        #: :meth:`reap` plus the files stored since.
+        self.bytes_on_disk = 0
+        #: Number of files removed so far.
+        self.files_reaped = 0
+        #: Bytes freed so far.
+        self.bytes_reaped = 0
+        self.lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def reap(self, now=None):
+        """
+        Remove the expired files and evict files beyond the quota.  Return
+        the number of files removed.
+        """
+        if now is None:
+            now = time.time()
+        entries = []
+        for name in os.listdir(self.directory):
+            if _tempstore_file.match(name) is None:
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if stat.S_ISREG(st.st_mode):
+                entries.append((st.st_mtime, st.st_size, path))
+        entries.sort()
+        total = sum(entry[1] for entry in entries)
+        expires = now - self.ttl
+        removed = freed = 0
+        for mtime, size, path in entries:
+            if mtime >= expires:
+                if self.max_bytes is None or total <= self.max_bytes:
+                    break
+                if path.endswith('.part'):
+                    continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            removed += 1
+            freed += size
+            total -= size
+        with self.lock:
+            self.bytes_on_disk = total
+            self.files_reaped += removed
+            self.bytes_reaped += freed
+        return removed
+
+    def stored(self, path):
+        """
+        Account for the file ``path`` just stored, waking the reaper's
+        thread up (or reaping at once if it is not running) if the files
+        exceed the quota.
+        """
+        try:
+            size = os.stat(path).st_size
+        except OSError:
+            return
+        with self.lock:
+            self.bytes_on_disk += size
+            over = (self.max_bytes is not None and
+                    self.bytes_on_disk > self.max_bytes)
+        if over:
+            if self._thread is not None and self._pid == os.getpid():
+                self._wake.set()
+            else:
+                self.reap()
+
+    def start(self):
+        """
+        Start the reaper's thread unless it is already running in this
+        process (it is started again in processes forked since), or
+        ``interval`` is ``0``.
+        """
+        if not self.interval:
+            return
+        with self.lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run,
+                                            name='pyramid_deform reaper')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        """ Stop the reaper's thread. """
+        thread = self._thread
+        self._thread = None
+        if thread is not None and self._pid == os.getpid():
+            self._wake.set()
+            thread.join()
+
+    def _run(self):
+        thread = self._thread
+        while self._thread is thread:
+            try:
+                self.reap()
+            except OSError:
+                # the directory is missing; try again later
+                pass
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+def tempstore_reaper(settings):
+    """
+    Return a :class:`TempstoreReaper` for the ``pyramid_deform.tempdir``
+    directory configured by ``settings``, or ``None`` if neither
+    ``pyramid_deform.tempstore_ttl`` nor
+    ``pyramid_deform.tempstore_max_bytes`` is set.
+    ``pyramid_deform.tempstore_reap_interval`` sets the interval of its
+    thread (``0`` disables it).
+    """
+    ttl = settings.get('pyramid_deform.tempstore_ttl', '').strip()
+    max_bytes = settings.get('pyramid_deform.tempstore_max_bytes',
+                             '').strip()
+    directory = settings.get('pyramid_deform.tempdir', '').strip()
+    if not directory or not (ttl or max_bytes):
+        return None
+    return TempstoreReaper(
+        directory,
+        ttl=int(ttl or 86400),
+        max_bytes=max_bytes and int(max_bytes) or None,
+        interval=int(settings.get('pyramid_deform.tempstore_reap_interval',
+                                  300)))
+
+def reap_tempstore(argv=sys.argv):
+    """
+    Console script removing the expired files of the tempstore configured
+    by a Pyramid ``.ini`` file once, for use from cron::
+
+      reap_deform_tempstore development.ini#main
+    """
+    import argparse
+    from pyramid.paster import get_appsettings
+    parser = argparse.ArgumentParser(
+        prog=os.path.basename(argv[0]),
+        description='Remove the expired files of pyramid_deform.tempdir.')
+    parser.add_argument('config_uri', help='the Pyramid .ini file')
+    args = parser.parse_args(argv[1:])
+    settings = get_appsettings(args.config_uri)
+    reaper = tempstore_reaper(settings)
+    if reaper is None:
+        parser.error('pyramid_deform.tempdir and pyramid_deform.tempstore_ttl '
+                     'or pyramid_deform.tempstore_max_bytes must be set')
+    removed = reaper.reap()
+    print('%d files removed, %d bytes left' % (removed, reaper.bytes_on_disk))
+
+class SessionFileUploadTempStore(object):
+    """
+    A Deform file upload temporary store keeping its index in the session
+    and the uploaded files in the ``pyramid_deform.tempdir`` directory.
+
+    Uploads are copied in chunks of ``pyramid_deform.tempstore_chunk_size``
+    bytes (see :func:`copy_stream`), unless they are already named files
+    on the same filesystem as the directory: those are hard linked into it
+    instead (see :func:`linkable_path`).  If
+    ``pyramid_deform.tempstore_async`` is true, uploads which are copied
+    are written by a thread pool (see :func:`tempstore_executor`) rather
+    than on the request's thread;
+    :meth:`get` then waits for the copy to finish, or, in another process,
+    for up to :attr:`write_timeout` seconds, and raises the error the copy
+    failed with, if any.  Uploads which aren't files are copied at once.
+
+    Files are kept until deleted by hand, unless
+    ``pyramid_deform.tempstore_ttl`` or ``pyramid_deform.tempstore_max_bytes``
+    is set: :func:`includeme` then registers a :class:`TempstoreReaper`,
+    which is started by the first store made in each process.  Reading a
+    file back renews it.
+    """
+    #: How long, in seconds, :meth:`get` waits for a file being written by
+    #: another process.
+    write_timeout = 60
+
+    def __init__(self, request):
+        settings = request.registry.settings
+        try:
+            self.tempdir = settings['pyramid_deform.tempdir']
+        except KeyError:
+            raise ConfigurationError(
+                'To use SessionFileUploadTempStore, you must set a  '
+                '"pyramid_deform.tempdir" key in your .ini settings. It '
+                'points to a directory which will temporarily '
+                'hold uploaded files when form validation fails.')
+        self.chunk_size = int(settings.get(
+            'pyramid_deform.tempstore_chunk_size', tempstore_chunk_size))
+        self.async_writes = asbool(settings.get(
+            'pyramid_deform.tempstore_async', False))
+        self.request = request
+        self.session = request.session
+        self.tempstore = self.session.setdefault('substanced.tempstore', {})
+        #: The :class:`TempstoreReaper` registered by :func:`includeme`, if
+        #: any.
+        self.reaper = getattr(request.registry,
+                              'pyramid_deform_tempstore_reaper', None)
+        if self.reaper is not None:
+            self.reaper.start()
+
+    @property
+    def bytes_on_disk(self):
+        """
+        Bytes taken by the stored files according to :attr:`reaper`, or
+        ``None`` without a reaper.
+        """
+        if self.reaper is not None:
+            return self.reaper.bytes_on_disk
+
+    @property
+    def files_reaped(self):
+        """
+        Number of files removed by :attr:`reaper`, or ``None`` without a
+        reaper.
+        """
+        if self.reaper is not None:
+            return self.reaper.files_reaped
+        
+    def preview_url(self, uid):
+        return None
+
+    def __contains__(self, name):
+        return name in self.tempstore
+
+    def __setitem__(self, name, data):
+        newdata = data.copy()
+        stream = newdata.pop('fp', None)
+
+        if stream is not None:
+            source = linkable_path(stream, self.tempdir)
+            # uploads are written asynchronously from a file of their own,
+            # if they are files, with a .part suffix until written
+            owned = None
+            if self.async_writes and source is None:
+                owned = _reopen_stream(stream)
+            suffix = owned is not None and '.part' or ''
+            while True:
+                randid = binascii.hexlify(os.urandom(20))
+                if not isinstance(randid, string_types):
+                    randid = randid.decode("ascii")
+                fn = os.path.join(self.tempdir, randid)
+                if source is not None:
+                    try:
+                        os.link(source, fn)
+                    except OSError as e:
+                        if e.errno != errno.EEXIST:
+                            # no hard links here: copy the file instead
+                            source = None
+                        continue
+                    os.utime(fn, None)
+                    newdata['randid'] = randid
+                    break
+                try:
+                    fd = os.open(fn + suffix,
+                                 os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+                except OSError as e:
+                    if e.errno != errno.EEXIST:
+                        raise
+                    continue
+                newdata['randid'] = randid
+                break
+            if source is None:
+                fp = os.fdopen(fd, 'wb')
+                if owned is not None:
+                    future = tempstore_executor().submit(
+                        self._write, owned, fp, fn + suffix, fn)
+                    _pending_writes[fn] = future
+                    # failures are recorded beside the file for get()
+                    future.add_done_callback(
+                        lambda future: _pending_writes.pop(fn, None))
+                else:
+                    self._write(stream, fp)
+                    self._stored(fn)
+            else:
+                self._stored(fn)
+
+        self.tempstore[name] = newdata
+        self.session.changed()
+
+    def _write(self, stream, fp, part=None, fn=None):
+        try:
+            with fp:
+                if part is None:
+                    copy_stream(stream, fp, self.chunk_size)
+                else:
+                    with stream:
+                        copy_stream(stream, fp, self.chunk_size)
+        except Exception as e:
+            if part is not None:
+                try:
+                    with open(fn + '.failed', 'w') as marker:
+                        marker.write(str(e))
+                except (IOError, OSError):
+                    pass
+                os.remove(part)
+            raise
+        if part is not None:
+            os.rename(part, fn)
+            self._stored(fn)
+
+    def _stored(self, fn):
+        if self.reaper is not None:
+            self.reaper.stored(fn)
+
+    def _wait_for_write(self, fn):
+        future = _pending_writes.get(fn)
+        if future is not None:
+            future.exception()
+        else:
+            deadline = time.time() + self.write_timeout
+            while (not os.path.exists(fn) and
+                   os.path.exists(fn + '.part') and
+                   time.time() < deadline):
+                time.sleep(0.05)
+        # a failed write is reported once
+        try:
+            with open(fn + '.failed') as marker:
+                message = marker.read()
+            os.remove(fn + '.failed')
+        except (IOError, OSError):
+            return
+        raise IOError('Storing the upload failed: %s' % message)
+
+    def get(self, name, default=None):
+        data = self.tempstore.get(name)
+
+        if data is None:
+            return default
+
+        newdata = data.copy()
+            
+        randid = newdata.get('randid')
+
+        if randid is not None:
+
+            fn = os.path.join(self.tempdir, randid)
+            if self.async_writes:
+                self._wait_for_write(fn)
+            try:
+                newdata['fp'] = open(fn, 'rb')
+                # renew the file for the reaper
+                os.utime(fn, None)
+            except (IOError, OSError):
+                pass
+
+        return newdata
+
+    def __getitem__(self, name):
+        data = self.get(name, _marker)
+        if data is _marker:
+            raise KeyError(name)
+        return data
+
+def chunks(stream, chunk_size=10000):
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
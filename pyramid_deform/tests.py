@@ -6,7 +6,11 @@
 # decrement_step
 # increment_step
 
+import hashlib
+import io
 import os
+import sys
+import time
 import unittest
 import shutil
 import tempfile
@@ -105,6 +109,31 @@ class TestFormView(unittest.TestCase):
         self.assertEqual(result,
                          {'css_links': (), 'js_links': (), 'form': 'failure'})
 
+    def test___call__bundles_resources(self):
+        class Bundler(object):
+            def bundle(self, resources, kind):
+                return ('bundle.' + kind,)
+        from pyramid.registry import Registry
+        request = DummyRequest()
+        request.registry = Registry('test')
+        request.registry.pyramid_deform_bundler = Bundler()
+        inst = self._makeOne(request)
+        inst.schema = DummySchema()
+        inst.form_class = DummyForm
+        result = inst()
+        self.assertEqual(result['js_links'], ['bundle.js'])
+        self.assertEqual(result['css_links'], ['bundle.css'])
+
+    def test_submitted(self):
+        request = DummyRequest()
+        request.POST['two'] = 'two'
+        inst = self._makeOne(request)
+        form = DummyForm(None, buttons=(DummyButton('one'),
+                                        DummyButton('two')))
+        self.assertTrue(inst.submitted(form) is form.buttons[1])
+        del request.POST['two']
+        self.assertEqual(inst.submitted(form), None)
+
     def test_get_bind_data_contains_request(self):
         request = DummyRequest()
         inst = self._makeOne(request)
@@ -142,6 +171,996 @@ class TestFormView(unittest.TestCase):
         for key, value in dict(form_options).items():
             self.assertEqual(getattr(form, key), value)
 
+    def test_cache_forms(self):
+        from pyramid_deform import form_cache
+        form_cache.clear()
+        schema = make_csrf_schema()
+        forms = []
+        for token in ('token1', 'token2'):
+            request = DummyRequest()
+            request.session.get_csrf_token = lambda token=token: token
+            inst = self._makeOne(request)
+            inst.schema = schema
+            inst.cache_forms = True
+            inst.before = forms.append
+            result = inst()
+            self.assertTrue('value="%s"' % token in result['form'])
+        self.assertEqual(form_cache.misses, 1)
+        self.assertEqual(form_cache.hits, 1)
+        self.assertFalse(forms[0] is forms[1])
+        self.assertEqual(forms[1].cstruct['csrf_token'], 'token2')
+        self.assertEqual(forms[1]['name'].oid, forms[0]['name'].oid)
+        form_cache.clear()
+
+    def test_cache_forms_after_bind_removes_node(self):
+        import colander
+        from pyramid_deform import form_cache
+        form_cache.clear()
+        class Schema(colander.Schema):
+            name = colander.SchemaNode(colander.String())
+            role = colander.SchemaNode(colander.String())
+            email = colander.SchemaNode(colander.String())
+            def after_bind(self, node, kw):
+                if not kw.get('admin'):
+                    del node['role']
+        schema = Schema()
+        for admin in (True, False, True):
+            inst = self._makeOne(DummyRequest())
+            inst.schema = schema
+            inst.cache_forms = True
+            inst.get_bind_data = lambda admin=admin: {'admin': admin}
+            html = inst()['form']
+            self.assertEqual('name="role"' in html, admin)
+            self.assertTrue('name="email"' in html)
+        form_cache.clear()
+
+    def test_cache_forms_deferred_node(self):
+        import colander
+        from pyramid_deform import form_cache
+        form_cache.clear()
+        @colander.deferred
+        def deferred_email(node, kw):
+            return colander.SchemaNode(colander.String())
+        class Schema(colander.Schema):
+            name = colander.SchemaNode(colander.String())
+            email = deferred_email
+        inst = self._makeOne(DummyRequest())
+        inst.schema = Schema()
+        inst.cache_forms = True
+        html = inst()['form']
+        self.assertTrue('name="email"' in html)
+        form_cache.clear()
+
+    def test_matches_schema(self):
+        import colander
+        import deform
+        from pyramid_deform import matches_schema
+        class Schema(colander.Schema):
+            a = colander.SchemaNode(colander.String())
+            b = colander.SchemaNode(colander.String())
+        form = deform.Form(Schema())
+        self.assertTrue(matches_schema(form, Schema()))
+        other = Schema()
+        other['b'] = colander.SchemaNode(colander.Int(), name='b')
+        self.assertFalse(matches_schema(form, other))
+        other = Schema()
+        del other['a']
+        other.add(colander.SchemaNode(colander.String(), name='c'))
+        self.assertFalse(matches_schema(form, other))
+
+    def test_cache_forms_unhashable_options(self):
+        from pyramid_deform import form_cache
+        form_cache.clear()
+        request = DummyRequest()
+        inst = self._makeOne(request)
+        inst.schema = make_csrf_schema()
+        inst.cache_forms = True
+        inst.form_options = (('unhashable', {}),)
+        inst()
+        self.assertEqual(form_cache.misses, 1)
+        self.assertEqual(form_cache.prototypes, {})
+
+    def test_cache_forms_widget_resources(self):
+        from pyramid_deform import form_cache
+        form_cache.clear()
+        from deform.form import Form as BaseForm
+        calls = []
+        class Form(BaseForm):
+            def get_widget_resources(self):
+                calls.append(self)
+                return {'js': ['a.js'], 'css': ['a.css']}
+        schema = make_csrf_schema()
+        for i in range(2):
+            inst = self._makeOne(DummyRequest())
+            inst.schema = schema
+            inst.form_class = Form
+            inst.cache_forms = True
+            result = inst()
+            self.assertEqual(result['js_links'], ['a.js'])
+            self.assertEqual(result['css_links'], ['a.css'])
+        self.assertEqual(len(calls), 1)
+        form_cache.clear()
+
+    def test_widget_resources_without_form(self):
+        from pyramid_deform import form_cache
+        form_cache.clear()
+        inst = self._makeOne(DummyRequest())
+        schema = inst.schema = DummySchema()
+        inst.form_class = DummyForm
+        self.assertEqual(inst.widget_resources(), {'js': [], 'css': []})
+        self.assertEqual(schema.kw, inst.get_bind_data())
+        self.assertEqual(len(form_cache.resources), 1)
+        form_cache.clear()
+
+    def test_incremental_bind(self):
+        schema = make_csrf_schema()
+        request = DummyRequest()
+        inst = self._makeOne(request)
+        inst.schema = schema
+        inst.incremental_bind = True
+        result = inst()
+        self.assertTrue('value="csrf_token"' in result['form'])
+        self.assertTrue(inst.schema['name'] is schema['name'])
+        self.assertFalse(inst.schema['csrf_token'] is schema['csrf_token'])
+
+class TestSchemaBinder(unittest.TestCase):
+    def _makeOne(self, schema):
+        from pyramid_deform import SchemaBinder
+        return SchemaBinder(schema)
+
+    def _makeSchema(self):
+        import colander
+        @colander.deferred
+        def deferred_default(node, kw):
+            return kw['value']
+        schema = colander.SchemaNode(
+            colander.Mapping(),
+            colander.SchemaNode(colander.String(), name='static'),
+            colander.SchemaNode(
+                colander.Mapping(),
+                colander.SchemaNode(colander.String(), name='deferred',
+                                    default=deferred_default),
+                colander.SchemaNode(colander.String(), name='static'),
+                name='sub'),
+            )
+        return schema
+
+    def test_bind_copies_only_deferred_nodes(self):
+        import colander
+        schema = self._makeSchema()
+        inst = self._makeOne(schema)
+        bound = inst.bind(value='abc')
+        self.assertFalse(bound is schema)
+        self.assertTrue(bound['static'] is schema['static'])
+        self.assertTrue(bound['sub']['static'] is schema['sub']['static'])
+        self.assertFalse(bound['sub'] is schema['sub'])
+        self.assertEqual(bound['sub']['deferred'].default, 'abc')
+        self.assertEqual(bound['sub']['deferred'].bindings, {'value': 'abc'})
+        self.assertEqual(bound.serialize(),
+                         {'static': colander.null,
+                          'sub': {'deferred': 'abc',
+                                  'static': colander.null}})
+        self.assertTrue(isinstance(schema['sub']['deferred'].default,
+                                   colander.deferred))
+
+    def test_bind_nothing_deferred(self):
+        import colander
+        schema = colander.SchemaNode(
+            colander.Mapping(),
+            colander.SchemaNode(colander.String(), name='static'))
+        inst = self._makeOne(schema)
+        self.assertTrue(inst.bind(value='abc') is schema)
+
+    def test_bind_after_bind_uses_colander_bind(self):
+        import colander
+        def after_bind(node, kw):
+            node.title = kw['value']
+        sub = colander.SchemaNode(colander.Mapping(), name='sub',
+                                  after_bind=after_bind)
+        schema = colander.SchemaNode(colander.Mapping(), sub)
+        inst = self._makeOne(schema)
+        bound = inst.bind(value='abc')
+        self.assertEqual(bound['sub'].title, 'abc')
+        self.assertEqual(sub.title, 'Sub')
+
+    def test_bind_deferred_node(self):
+        import colander
+        @colander.deferred
+        def deferred_node(node, kw):
+            return colander.SchemaNode(colander.String())
+        class Schema(colander.Schema):
+            extra = deferred_node
+        inst = self._makeOne(Schema())
+        bound = inst.bind()
+        self.assertEqual(bound['extra'].title, 'Extra')
+
+    def test_bind_copies_nodes_reading_bindings(self):
+        import colander
+        def validator(node, value):
+            if value != node.bindings['value']:
+                raise colander.Invalid(node, 'Wrong')
+        def preparer(value):
+            return value
+        schema = colander.SchemaNode(
+            colander.Mapping(),
+            colander.SchemaNode(colander.String(), name='custom',
+                                validator=validator),
+            colander.SchemaNode(colander.String(), name='prepared',
+                                preparer=[preparer]),
+            colander.SchemaNode(
+                colander.String(), name='builtin',
+                validator=colander.All(colander.Length(1),
+                                       colander.OneOf(['a']))),
+            colander.SchemaNode(
+                colander.String(), name='function',
+                validator=colander.Function(lambda value: True)),
+            )
+        inst = self._makeOne(schema)
+        bound = inst.bind(value='abc')
+        self.assertTrue(bound['builtin'] is schema['builtin'])
+        self.assertEqual(bound['builtin'].bindings, None)
+        for name in ('custom', 'prepared', 'function'):
+            self.assertFalse(bound[name] is schema[name])
+            self.assertEqual(bound[name].bindings, {'value': 'abc'})
+        self.assertEqual(bound['custom'].deserialize('abc'), 'abc')
+        self.assertRaises(colander.Invalid, bound['custom'].deserialize, 'x')
+
+    def test_bind_child_added_after_scan(self):
+        import colander
+        schema = self._makeSchema()
+        inst = self._makeOne(schema)
+        schema.add(colander.SchemaNode(colander.String(), name='added'))
+        schema['sub'].add(colander.SchemaNode(colander.String(),
+                                              name='added'))
+        bound = inst.bind(value='abc')
+        self.assertTrue(bound['added'] is schema['added'])
+        self.assertEqual(bound['sub']['added'].name, 'added')
+        self.assertEqual(bound['sub']['deferred'].default, 'abc')
+
+    def test_varies(self):
+        inst = self._makeOne(self._makeSchema())
+        self.assertTrue(inst.varies())
+        self.assertTrue(inst.varies(('static',)))
+        self.assertFalse(inst.varies(('sub',)))
+
+    def test_varies_ignores_validators(self):
+        import colander
+        def validator(node, value):
+            pass
+        schema = colander.SchemaNode(
+            colander.Mapping(),
+            colander.SchemaNode(colander.String(), name='custom',
+                                validator=validator))
+        self.assertFalse(self._makeOne(schema).varies())
+
+    def test_varies_after_bind(self):
+        import colander
+        schema = colander.SchemaNode(colander.Mapping(),
+                                     after_bind=lambda node, kw: None)
+        self.assertTrue(self._makeOne(schema).varies())
+
+class Test_copy_form(unittest.TestCase):
+    def _callFUT(self, prototype, schema):
+        from pyramid_deform import copy_form
+        return copy_form(prototype, schema)
+
+    def _makeSchema(self):
+        import colander
+        class Item(colander.SequenceSchema):
+            name = colander.SchemaNode(colander.String())
+        class Schema(colander.Schema):
+            title = colander.SchemaNode(colander.String())
+            items = Item()
+        return Schema()
+
+    def test_matches_fresh_form(self):
+        import deform
+        schema = self._makeSchema()
+        prototype = deform.Form(schema)
+        fresh = deform.Form(schema)
+        copied = self._callFUT(prototype, schema)
+        self.assertEqual(copied.render(), fresh.render())
+        self.assertEqual([field.oid for field in copied.children],
+                         [field.oid for field in fresh.children])
+        self.assertEqual(copied.get_widget_resources(),
+                         fresh.get_widget_resources())
+        self.assertTrue(isinstance(copied.get_widget_resources()['js'],
+                                   list))
+
+    def test_counter_per_copy(self):
+        import deform
+        schema = self._makeSchema()
+        prototype = deform.Form(schema)
+        fresh = deform.Form(schema)
+        oids = []
+        for i in range(2):
+            copied = self._callFUT(prototype, schema)
+            oids.append(copied['items'].children[0].clone().oid)
+        self.assertEqual(oids[0], oids[1])
+        self.assertEqual(oids[0],
+                         fresh['items'].children[0].clone().oid)
+
+class Test_reads_bindings(unittest.TestCase):
+    def _callFUT(self, func):
+        from pyramid_deform import reads_bindings
+        return reads_bindings(func)
+
+    def test_it(self):
+        import colander
+        self.assertFalse(self._callFUT(None))
+        self.assertFalse(self._callFUT(colander.Length(1)))
+        self.assertFalse(self._callFUT(colander.url))
+        self.assertFalse(self._callFUT(colander.luhnok))
+        self.assertFalse(self._callFUT(
+            colander.Any(colander.Length(1), colander.Email())))
+        self.assertTrue(self._callFUT(lambda node, value: None))
+        self.assertTrue(self._callFUT(colander.Function(lambda value: 1)))
+        self.assertTrue(self._callFUT(
+            colander.All(colander.Length(1), lambda node, value: None)))
+        self.assertTrue(self._callFUT([colander.Length(1), str.strip]))
+
+class Test_bind_schema(unittest.TestCase):
+    def _callFUT(self, schema, **kw):
+        from pyramid_deform import bind_schema
+        return bind_schema(schema, **kw)
+
+    def test_binder_reused(self):
+        schema = make_csrf_schema()
+        bound1 = self._callFUT(schema, request=DummyRequest())
+        binder = schema._pyramid_deform_binder
+        bound2 = self._callFUT(schema, request=DummyRequest())
+        self.assertTrue(schema._pyramid_deform_binder is binder)
+        self.assertFalse(bound1 is bound2)
+
+    def test_clone_gets_own_binder(self):
+        schema = make_csrf_schema()
+        self._callFUT(schema, request=DummyRequest())
+        clone = schema.clone()
+        self._callFUT(clone, request=DummyRequest())
+        self.assertTrue(clone._pyramid_deform_binder.schema is clone)
+        self.assertTrue(schema._pyramid_deform_binder.schema is schema)
+
+    def test_schemas_collected(self):
+        import gc
+        import weakref
+        refs = []
+        for num in range(10):
+            schema = make_csrf_schema()
+            self._callFUT(schema, request=DummyRequest())
+            refs.append(weakref.ref(schema))
+        del schema
+        gc.collect()
+        self.assertEqual([ref for ref in refs if ref() is not None], [])
+
+    def test_bound_schema_returned_unchanged(self):
+        schema = make_csrf_schema()
+        bound = self._callFUT(schema, request=DummyRequest())
+        self.assertTrue(self._callFUT(bound, request=DummyRequest()) is bound)
+
+def resolved(value):
+    # an awaitable which is not a coroutine (no async syntax needed here)
+    import asyncio
+    future = asyncio.get_running_loop().create_future()
+    future.set_result(value)
+    return future
+
+@unittest.skipIf(sys.version_info < (3, 7), 'asyncio.run required')
+class TestAsyncFormView(unittest.TestCase):
+    def _makeOne(self, request):
+        from pyramid_deform.asyncview import AsyncFormView
+        inst = AsyncFormView(request)
+        inst.schema = make_csrf_schema()
+        return inst
+
+    def _run(self, inst):
+        import asyncio
+        return asyncio.run(inst())
+
+    def test_show(self):
+        request = DummyRequest()
+        inst = self._makeOne(request)
+        inst.appstruct = lambda: resolved({'name': 'fred'})
+        result = self._run(inst)
+        self.assertTrue('value="fred"' in result['form'])
+        self.assertTrue('value="csrf_token"' in result['form'])
+        self.assertTrue('js_links' in result)
+
+    def test_show_render_cache(self):
+        from pyramid_deform import RenderCache
+        request = DummyRequest()
+        inst = self._makeOne(request)
+        inst.render_cache = RenderCache()
+        result = self._run(inst)
+        self.assertTrue('value="csrf_token"' in result['form'])
+        self.assertEqual(inst.render_cache.misses, 1)
+
+    def test_success(self):
+        request = DummyRequest(post={'csrf_token': 'csrf_token',
+                                     'name': 'fred', 'submit': 'submit'})
+        inst = self._makeOne(request)
+        inst.buttons = ('submit',)
+        inst.get_bind_data = lambda: resolved({'request': request})
+        inst.submit_success = lambda validated: resolved(('ok', validated))
+        result = self._run(inst)
+        self.assertEqual(result, ('ok', {'csrf_token': 'csrf_token',
+                                         'name': 'fred'}))
+
+    def test_failure(self):
+        request = DummyRequest(post={'csrf_token': 'csrf_token',
+                                     'name': '', 'submit': 'submit'})
+        inst = self._makeOne(request)
+        inst.buttons = ('submit',)
+        inst.submit_success = lambda validated: 'success'
+        result = self._run(inst)
+        self.assertTrue('Errors have been highlighted' in result['form'])
+        inst = self._makeOne(request)
+        inst.buttons = ('submit',)
+        inst.submit_success = lambda validated: 'success'
+        inst.submit_failure = lambda e: resolved('failed')
+        self.assertEqual(self._run(inst), 'failed')
+
+    def test_stream(self):
+        from pyramid_deform import FormStream
+        request = DummyRequest()
+        inst = self._makeOne(request)
+        inst.stream = True
+        result = self._run(inst)
+        self.assertTrue(isinstance(result['form'], FormStream))
+        self.assertTrue('value="csrf_token"' in str(result['form']))
+
+    def test_concurrent_validators(self):
+        import colander
+        # built with exec, as async syntax doesn't compile before Python 3.5
+        namespace = {'colander': colander}
+        exec('async def check_name(node, value):\n'
+             '    raise colander.Invalid(node, "Taken name")\n', namespace)
+        check_name = namespace['check_name']
+        def check_city(node, value):
+            raise colander.Invalid(node, 'Unknown city')
+        from pyramid_deform import CSRFSchema
+        class Schema(CSRFSchema):
+            name = colander.SchemaNode(colander.String(),
+                                       concurrent_validator=check_name)
+            city = colander.SchemaNode(colander.String(),
+                                       concurrent_validator=check_city)
+        request = DummyRequest(post={'csrf_token': 'csrf_token',
+                                     'name': 'fred', 'city': 'rome',
+                                     'submit': 'submit'})
+        inst = self._makeOne(request)
+        inst.schema = Schema()
+        inst.buttons = ('submit',)
+        inst.submit_success = lambda validated: 'success'
+        inst.submit_failure = lambda e: e
+        error = self._run(inst).error
+        self.assertEqual(sorted(error.asdict().values()),
+                         ['Taken name', 'Unknown city'])
+        request.POST['name'] = ''
+        error = self._run(inst).error
+        self.assertEqual(error.asdict(), {'name': 'Required',
+                                          'city': 'Unknown city'})
+
+    def test_run_in_executor_threadlocals(self):
+        import asyncio
+        from pyramid.threadlocal import get_current_request
+        request = DummyRequest()
+        inst = self._makeOne(request)
+        result = asyncio.run(inst.run_in_executor(get_current_request))
+        self.assertTrue(result is request)
+
+    def test_run_in_executor_shared_executor(self):
+        import asyncio
+        import threading
+        from pyramid_deform.asyncview import default_executor
+        inst = self._makeOne(DummyRequest())
+        threads = set()
+        for i in range(5):
+            run = inst.run_in_executor(threading.get_ident)
+            threads.add(asyncio.run(run))
+        self.assertTrue(default_executor() is default_executor())
+        self.assertTrue(threading.get_ident() not in threads)
+        workers = set(thread.ident for thread in default_executor()._threads)
+        self.assertTrue(threads <= workers)
+
+class TestConcurrentValidators(unittest.TestCase):
+    def _makeOne(self, request, schema):
+        from pyramid_deform import FormView
+        inst = FormView(request)
+        inst.schema = schema
+        inst.buttons = ('submit',)
+        inst.submit_success = lambda validated: ('ok', validated)
+        return inst
+
+    def _makeSchema(self, validator):
+        import colander
+        from pyramid_deform import CSRFSchema
+        class Address(colander.MappingSchema):
+            city = colander.SchemaNode(colander.String(),
+                                       concurrent_validator=validator)
+        class Schema(CSRFSchema):
+            name = colander.SchemaNode(colander.String(),
+                                       concurrent_validator=validator)
+            address = Address()
+        return Schema()
+
+    def _post(self, name, city):
+        return DummyRequest(post={
+            'csrf_token': 'csrf_token', 'name': name, '__start__':
+            'address:mapping', 'city': city, '__end__': 'address:mapping',
+            'submit': 'submit'})
+
+    def test_success(self):
+        import threading
+        calls = []
+        both = threading.Barrier(2, timeout=5)
+        def validator(node, value):
+            calls.append(value)
+            both.wait()
+        inst = self._makeOne(self._post('fred', 'rome'),
+                             self._makeSchema(validator))
+        result = inst()
+        self.assertEqual(result[0], 'ok')
+        self.assertEqual(sorted(calls), ['fred', 'rome'])
+
+    def test_failure_merges_errors(self):
+        import colander
+        def validator(node, value):
+            raise colander.Invalid(node, 'Bad %s' % value)
+        inst = self._makeOne(self._post('fred', 'rome'),
+                             self._makeSchema(validator))
+        result = inst()
+        self.assertTrue('Bad fred' in result['form'])
+        self.assertTrue('Bad rome' in result['form'])
+
+    def test_merged_with_schema_errors(self):
+        import colander
+        calls = []
+        def validator(node, value):
+            calls.append(value)
+            raise colander.Invalid(node, 'Bad %s' % value)
+        inst = self._makeOne(self._post('', 'rome'),
+                             self._makeSchema(validator))
+        inst.submit_failure = lambda e: e
+        error = inst().error
+        self.assertEqual(calls, ['rome'])
+        self.assertEqual(error.asdict(), {'name': 'Required',
+                                          'address.city': 'Bad rome'})
+
+    def test_find_in_failure(self):
+        import colander
+        from pyramid_deform import find_concurrent_validators_in_failure
+        validator = lambda node, value: None
+        class Item(colander.MappingSchema):
+            name = colander.SchemaNode(colander.String(),
+                                       concurrent_validator=validator)
+            count = colander.SchemaNode(colander.Int())
+        class Items(colander.SequenceSchema):
+            item = Item()
+        class Schema(colander.MappingSchema):
+            items = Items()
+        schema = Schema()
+        cstruct = {'items': [{'name': colander.null, 'count': '1'},
+                             {'name': 'b', 'count': '1'}]}
+        try:
+            schema.deserialize(cstruct)
+        except colander.Invalid as e:
+            error = e
+        found = list(find_concurrent_validators_in_failure(
+            schema, cstruct, error))
+        self.assertEqual([([pos for pos, node in path], value)
+                          for path, node, value in found],
+                         [([0, 1, 0], 'b')])
+
+    def test_find_sequence(self):
+        import colander
+        from pyramid_deform import find_concurrent_validators
+        validator = lambda node, value: None
+        class Names(colander.SequenceSchema):
+            name = colander.SchemaNode(colander.String(),
+                                       concurrent_validator=validator)
+        class Schema(colander.MappingSchema):
+            names = Names()
+        schema = Schema()
+        found = list(find_concurrent_validators(
+            schema, {'names': ['a', colander.null, 'b']}))
+        self.assertEqual([(path[-1][0], value) for path, node, value in found],
+                         [(0, 'a'), (2, 'b')])
+
+    def test_raise_validation_failure_root(self):
+        import colander
+        import deform
+        from pyramid_deform import raise_validation_failure
+        request = DummyRequest()
+        form = deform.Form(make_csrf_schema().bind(request=request))
+        form.validate([('csrf_token', 'csrf_token'), ('name', 'fred')])
+        error = colander.Invalid(form.schema, 'Bad form')
+        try:
+            raise_validation_failure(form, [((), error)])
+        except deform.ValidationFailure as e:
+            self.assertEqual(e.error.msg, 'Bad form')
+        else:
+            self.fail('ValidationFailure not raised')
+
+class TestFormViewCSRF(unittest.TestCase):
+    def setUp(self):
+        from pyramid.csrf import LegacySessionCSRFStoragePolicy
+        self.config = testing.setUp()
+        self.config.set_csrf_storage_policy(LegacySessionCSRFStoragePolicy())
+
+    def tearDown(self):
+        testing.tearDown()
+
+    def _makeOne(self, request):
+        import colander
+        from pyramid_deform import FormView
+        class Schema(colander.Schema):
+            name = colander.SchemaNode(colander.String())
+        inst = FormView(request)
+        inst.schema = Schema()
+        inst.csrf = True
+        inst.buttons = ('submit',)
+        inst.submit_success = lambda validated: validated
+        return inst
+
+    def test_show(self):
+        inst = self._makeOne(DummyRequest())
+        html = inst()['form']
+        self.assertTrue(
+            '<input type="hidden" name="csrf_token" value="csrf_token"/>'
+            in html)
+        self.assertEqual(html.count('name="csrf_token"'), 1)
+
+    def test_show_stream(self):
+        inst = self._makeOne(DummyRequest())
+        inst.stream = True
+        inst.stream_chunk_size = 1
+        chunks = list(inst()['form'])
+        self.assertTrue('name="csrf_token"' in chunks[0])
+        self.assertFalse('name="csrf_token"' in ''.join(chunks[1:]))
+
+    def test_valid_token(self):
+        request = DummyRequest(post={'csrf_token': 'csrf_token',
+                                     'name': 'fred', 'submit': 'submit'})
+        inst = self._makeOne(request)
+        self.assertEqual(inst()['name'], 'fred')
+
+    def test_header_token(self):
+        request = DummyRequest(post={'name': 'fred', 'submit': 'submit'},
+                               headers={'X-CSRF-Token': 'csrf_token'})
+        inst = self._makeOne(request)
+        self.assertEqual(inst()['name'], 'fred')
+
+    def test_invalid_token(self):
+        from pyramid.exceptions import BadCSRFToken
+        for post in ({'csrf_token': 'wrong', 'submit': 'submit'},
+                     {'submit': 'submit'}):
+            inst = self._makeOne(DummyRequest(post=post))
+            inst.get_bind_data = Mock()
+            self.assertRaises(BadCSRFToken, inst)
+            self.assertFalse(inst.get_bind_data.called)
+
+    def test_failure(self):
+        request = DummyRequest(post={'csrf_token': 'csrf_token', 'name': '',
+                                     'submit': 'submit'})
+        html = self._makeOne(request)()['form']
+        self.assertTrue('Errors have been highlighted' in html)
+        self.assertTrue('value="csrf_token"' in html)
+
+    def test_storage_policy(self):
+        from pyramid.interfaces import ICSRFStoragePolicy
+        class Policy(object):
+            def get_csrf_token(self, request):
+                return 'policy_token'
+        request = DummyRequest(post={'csrf_token': 'policy_token',
+                                     'name': 'fred', 'submit': 'submit'})
+        request.registry.registerUtility(Policy(), ICSRFStoragePolicy)
+        try:
+            self.assertEqual(self._makeOne(request)()['name'], 'fred')
+            request = DummyRequest()
+            html = self._makeOne(request)()['form']
+            self.assertTrue('value="policy_token"' in html)
+        finally:
+            request.registry.unregisterUtility(provided=ICSRFStoragePolicy)
+
+class TestFormViewDispatch(unittest.TestCase):
+    def _makeOne(self, post):
+        from webob.multidict import MultiDict
+        from pyramid_deform import FormView
+        class View(FormView):
+            def save_success(self, appstruct): pass
+            def save_failure(self, e): pass
+            def cancel_success(self, appstruct): pass
+        request = DummyRequest()
+        request.POST = MultiDict(post)
+        return View(request)
+
+    def _makeForm(self):
+        from deform.form import Button
+        return DummyForm(DummySchema(),
+                         buttons=(Button('save'), Button('cancel')))
+
+    def test_submitted(self):
+        inst = self._makeOne([('name', 'fred'), ('cancel', 'cancel')])
+        self.assertEqual(inst.submitted(self._makeForm()).name, 'cancel')
+
+    def test_not_submitted(self):
+        inst = self._makeOne([('name', 'fred')])
+        self.assertEqual(inst.submitted(self._makeForm()), None)
+
+    def test_handlers(self):
+        inst = self._makeOne([])
+        form = self._makeForm()
+        self.assertEqual(inst.handlers(form, form.buttons[0]),
+                         (inst.save_success, inst.save_failure))
+        self.assertEqual(inst.handlers(form, form.buttons[1]),
+                         (inst.cancel_success, inst.failure))
+
+    def test_dispatch_table_cached(self):
+        from pyramid_deform import _dispatch_table
+        inst = self._makeOne([])
+        form = self._makeForm()
+        table = _dispatch_table(inst.__class__, form.buttons)
+        self.assertTrue(_dispatch_table(inst.__class__, ('save', 'cancel'))
+                        is table)
+        self.assertEqual(table[1]['save'], ('save_success', 'save_failure'))
+
+    def test_dispatch_tables_bounded(self):
+        import pyramid_deform
+        from pyramid_deform import _dispatch_table
+        inst = self._makeOne([])
+        maxsize = pyramid_deform._dispatch_tables_maxsize
+        for i in range(maxsize + 10):
+            _dispatch_table(inst.__class__, ('button%d' % i,))
+        self.assertEqual(len(pyramid_deform._dispatch_tables), maxsize)
+
+class Test_iter_controls(unittest.TestCase):
+    def _callFUT(self, post):
+        from pyramid_deform import iter_controls
+        return iter_controls(post)
+
+    def test_multidict(self):
+        from webob.multidict import MultiDict
+        post = MultiDict([('a', '1'), ('b', '2'), ('a', '3')])
+        controls = self._callFUT(post)
+        self.assertFalse(isinstance(controls, list))
+        self.assertEqual(list(controls), [('a', '1'), ('b', '2'), ('a', '3')])
+
+    def test_items_only(self):
+        class Post(object):
+            def items(self):
+                return [('a', '1')]
+        self.assertEqual(list(self._callFUT(Post())), [('a', '1')])
+
+class TestFormStream(unittest.TestCase):
+    def _makeForm(self):
+        import colander
+        import deform
+        class Item(colander.MappingSchema):
+            a = colander.SchemaNode(colander.String())
+            b = colander.SchemaNode(colander.Int())
+        class Items(colander.SequenceSchema):
+            item = Item()
+        class Schema(colander.MappingSchema):
+            title = colander.SchemaNode(colander.String())
+            items = Items()
+        return deform.Form(Schema(), buttons=('submit',))
+
+    def _normalize(self, html):
+        import re
+        return re.sub(r'\s+', ' ', re.sub(r'deformField\d+', 'oid', html))
+
+    def _appstruct(self):
+        return {'title': 'x',
+                'items': [{'a': 'v%d' % i, 'b': i} for i in range(20)]}
+
+    def test_iter_render(self):
+        from pyramid_deform import iter_render
+        appstruct = self._appstruct()
+        expected = self._makeForm().render(appstruct)
+        form = self._makeForm()
+        renderer = form.renderer
+        chunks = list(iter_render(form, lambda: form.render(appstruct), 1024))
+        self.assertTrue(len(chunks) > 5)
+        self.assertTrue(all(len(chunk) >= 1024 for chunk in chunks[:-1]))
+        html = ''.join(chunks)
+        self.assertFalse('pyramid-deform-stream' in html)
+        self.assertEqual(self._normalize(html), self._normalize(expected))
+        self.assertTrue(form.renderer is renderer)
+        self.assertTrue(form['items'].children[0].renderer is renderer)
+
+    def test_threadlocals(self):
+        from pyramid.threadlocal import get_current_request
+        from pyramid_deform import FormStream
+        form = self._makeForm()
+        request = testing.DummyRequest()
+        seen = []
+        def render():
+            seen.append(get_current_request())
+            return form.render(self._appstruct())
+        testing.setUp(request=request)
+        try:
+            stream = FormStream(form, render)
+        finally:
+            testing.tearDown()
+        # as when a response's app_iter is consumed
+        self.assertEqual(get_current_request(), None)
+        self.assertTrue(list(stream.app_iter()))
+        self.assertEqual(seen, [request])
+        self.assertEqual(get_current_request(), None)
+
+    def test_failure(self):
+        import deform
+        from pyramid_deform import FormStream
+        controls = [('title', '')]
+        try:
+            self._makeForm().validate(controls)
+        except deform.ValidationFailure as e:
+            expected = e.render()
+        try:
+            self._makeForm().validate(controls)
+        except deform.ValidationFailure as e:
+            stream = FormStream(e.field, e.render)
+        self.assertEqual(self._normalize(str(stream)),
+                         self._normalize(expected))
+
+    def test_app_iter(self):
+        from pyramid_deform import FormStream
+        form = DummyForm(DummySchema(), renderer=None, children=[])
+        stream = FormStream(form, form.render)
+        self.assertEqual(list(stream.app_iter('<p>', '</p>')),
+                         [b'<p>', b'rendered with None', b'</p>'])
+
+    def test_form_view(self):
+        from pyramid_deform import FormStream
+        from pyramid_deform import FormView
+        request = DummyRequest(post={'csrf_token': 'csrf_token',
+                                     'name': '', 'submit': 'submit'})
+        inst = FormView(request)
+        inst.schema = make_csrf_schema()
+        inst.stream = True
+        inst.appstruct = lambda: {'name': 'fred'}
+        result = inst()
+        self.assertTrue(isinstance(result['form'], FormStream))
+        self.assertTrue('value="fred"' in result['form'].__html__())
+        inst.buttons = ('submit',)
+        inst.submit_success = lambda validated: 'success'
+        result = inst()
+        self.assertTrue(isinstance(result['form'], FormStream))
+        self.assertTrue('Errors have been highlighted' in str(result['form']))
+
+class TestFormViewRenderCache(unittest.TestCase):
+    def _makeOne(self, request, cache):
+        from pyramid_deform import FormView
+        inst = FormView(request)
+        inst.schema = make_csrf_schema()
+        inst.render_cache = cache
+        return inst
+
+    def _makeCache(self):
+        from pyramid_deform import RenderCache
+        return RenderCache()
+
+    def test_show_splices_csrf_token(self):
+        cache = self._makeCache()
+        results = []
+        for token in ('token1', 'token2'):
+            request = DummyRequest()
+            request.session.get_csrf_token = lambda token=token: token
+            inst = self._makeOne(request, cache)
+            results.append(inst()['form'])
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertTrue('value="token2"' in results[1])
+        self.assertFalse('token1' in results[1])
+        self.assertFalse('pyramid-deform-' in results[1])
+        self.assertEqual(results[0].replace('token1', 'token2'), results[1])
+
+    def test_show_appstruct_in_key(self):
+        cache = self._makeCache()
+        for name in ('<one>', '<two>'):
+            inst = self._makeOne(DummyRequest(), cache)
+            inst.appstruct = lambda name=name: {'name': name}
+            result = inst()['form']
+            self.assertTrue('&lt;%s&gt;' % name[1:-1] in result)
+        self.assertEqual((cache.hits, cache.misses), (0, 2))
+
+    def test_show_same_repr_different_values(self):
+        # like an ORM object whose repr doesn't show its values
+        class Record(dict):
+            def __repr__(self):
+                return '<Record>'
+        cache = self._makeCache()
+        for name in ('alice', 'bob'):
+            inst = self._makeOne(DummyRequest(), cache)
+            inst.appstruct = lambda name=name: Record(name=name)
+            result = inst()['form']
+            self.assertTrue('value="%s"' % name in result)
+        self.assertEqual((cache.hits, cache.misses), (0, 2))
+
+    def test_show_deferred_widget_bypasses_cache(self):
+        import colander
+        import deform.widget
+        from pyramid_deform import CSRFSchema
+        @colander.deferred
+        def deferred_widget(node, kw):
+            choice = kw['request'].GET['c']
+            return deform.widget.SelectWidget(values=[(choice, choice)])
+        class Schema(CSRFSchema):
+            name = colander.SchemaNode(colander.String(),
+                                       widget=deferred_widget)
+        schema = Schema()
+        cache = self._makeCache()
+        for choice in ('p', 'q'):
+            request = DummyRequest(params={'c': choice})
+            inst = self._makeOne(request, cache)
+            inst.schema = schema
+            result = inst()['form']
+            self.assertTrue('value="%s"' % choice in result)
+        self.assertEqual((cache.hits, cache.misses), (0, 0))
+
+class TestRenderCache(unittest.TestCase):
+    def _makeOne(self, maxsize):
+        from pyramid_deform import RenderCache
+        return RenderCache(maxsize)
+
+    def test_lru_eviction(self):
+        inst = self._makeOne(2)
+        inst.set('a', 'A')
+        inst.set('b', 'B')
+        self.assertEqual(inst.get('a'), 'A')
+        inst.set('c', 'C')
+        self.assertEqual(inst.get('b'), None)
+        self.assertEqual(inst.get('a'), 'A')
+        self.assertEqual(inst.get('c'), 'C')
+        self.assertEqual((inst.hits, inst.misses), (3, 1))
+
+    def test_clear(self):
+        inst = self._makeOne(2)
+        inst.set('a', 'A')
+        inst.get('a')
+        inst.clear()
+        self.assertEqual(inst.get('a'), None)
+        self.assertEqual((inst.hits, inst.misses), (0, 1))
+
+class TestFormCache(unittest.TestCase):
+    def _makeOne(self):
+        from pyramid_deform import FormCache
+        return FormCache()
+
+    def test_get(self):
+        inst = self._makeOne()
+        self.assertEqual(inst.get('a', lambda: 1), 1)
+        self.assertEqual(inst.get('a', lambda: 2), 1)
+        self.assertEqual((inst.hits, inst.misses), (1, 1))
+
+    def test_maxsize(self):
+        inst = self._makeOne()
+        inst.maxsize = 2
+        inst.get('a', lambda: 1)
+        inst.get('b', lambda: 2)
+        inst.get('a', lambda: 3)
+        inst.get('c', lambda: 4)
+        self.assertEqual(list(inst.prototypes), ['a', 'c'])
+        self.assertEqual((inst.hits, inst.misses), (1, 3))
+
+    def test_get_resources(self):
+        inst = self._makeOne()
+        inst.maxsize = 2
+        for key in ('a', 'b', 'a', 'c'):
+            inst.get_resources(key, lambda: {'js': (key,)})
+        self.assertEqual(list(inst.resources), ['a', 'c'])
+        self.assertEqual(inst.resources['a'], {'js': ('a',)})
+
+    def test_unhashable(self):
+        inst = self._makeOne()
+        self.assertEqual(inst.get(({},), lambda: 1), 1)
+        self.assertEqual(inst.prototypes, {})
+
+    def test_clear(self):
+        inst = self._makeOne()
+        inst.get('a', lambda: 1)
+        inst.clear()
+        self.assertEqual(inst.prototypes, {})
+        self.assertEqual((inst.hits, inst.misses), (0, 0))
+
 class TestFormWizardView(unittest.TestCase):
     def _makeOne(self, wizard):
         from pyramid_deform import FormWizardView
@@ -154,6 +1173,102 @@ class TestFormWizardView(unittest.TestCase):
         result = inst(request)
         self.assertEqual(result, 'done')
 
+    def test___call__done_states_by_name(self):
+        schema = DummySchema()
+        wizard = DummyFormWizard(schema)
+        done_states = []
+        wizard.done = lambda request, states: done_states.append(dict(states))
+        inst = self._makeOne(wizard)
+        request = DummyRequest()
+        request.session['pyramid_deform.wizards'] = {
+            'name': {'step':1, 'states':{0:'state'}}}
+        inst(request)
+        self.assertEqual(done_states, [{0:'state', 'schema':'state'}])
+
+    def test___call__flushes_wizard_state_once(self):
+        schema = DummySchema()
+        wizard = DummyFormWizard(schema)
+        inst = self._makeOne(wizard)
+        inst.form_view_class = DummyFormView
+        request = DummyRequest()
+        request.GET['step'] = '0'
+        inst(request)
+        self.assertEqual(request.session.changed_count, 1)
+
+    def _makeWizard(self):
+        import colander
+        from pyramid_deform import FormWizard
+        one = colander.SchemaNode(
+            colander.Mapping(),
+            colander.SchemaNode(colander.String(), name='a'), name='one')
+        two = colander.SchemaNode(
+            colander.Mapping(),
+            colander.SchemaNode(colander.String(), name='b'), name='two')
+        return FormWizard('name', lambda request, states: dict(states),
+                          one, two)
+
+    def test___call__direct_render(self):
+        wizard = self._makeWizard()
+        inst = self._makeOne(wizard)
+        inst.direct_render = True
+        request = DummyRequest(params={'step':'0'},
+                               post={'a':'1', 'next':'next'})
+        result = inst(request)
+        self.assertTrue('name="b"' in result['form'])
+        self.assertTrue('action="http://example.com"' in result['form'])
+        self.assertTrue('name="previous"' in result['form'])
+        state = request.session['pyramid_deform.wizards']['name']
+        self.assertEqual(state, {'step':1, 'states':{0:{'a':'1'}}})
+        self.assertEqual(request.session.changed_count, 1)
+
+    def test___call__direct_render_last_step_redirects(self):
+        wizard = self._makeWizard()
+        inst = self._makeOne(wizard)
+        inst.direct_render = True
+        request = DummyRequest(post={'b':'2', 'next':'next'})
+        request.session['pyramid_deform.wizards'] = {'name': {'step':1}}
+        result = inst(request)
+        self.assertEqual(result.location, 'http://example.com')
+        state = request.session['pyramid_deform.wizards']['name']
+        self.assertEqual(state['step'], 2)
+
+    def test___call__direct_render_previous_failure(self):
+        wizard = self._makeWizard()
+        inst = self._makeOne(wizard)
+        inst.direct_render = True
+        request = DummyRequest(post={'b':'', 'previous':'previous'})
+        request.session['pyramid_deform.wizards'] = {'name': {'step':1}}
+        result = inst(request)
+        self.assertTrue('name="a"' in result['form'])
+        self.assertFalse('error' in result['form'])
+
+    def test___call__prebuilt_buttons(self):
+        wizard = self._makeWizard()
+        buttons = []
+        for i in range(2):
+            inst = self._makeOne(wizard)
+            inst.form_view_class = DummyFormView
+            request = DummyRequest()
+            request.session['pyramid_deform.wizards'] = {'name': {'step':1}}
+            inst(request)
+            buttons.append(request.form_view.buttons)
+        self.assertTrue(buttons[0] is buttons[1])
+        self.assertEqual([b.name for b in buttons[0]], ['previous', 'next'])
+        self.assertEqual(buttons[0][1].title, 'Done')
+
+    def test___call__cache_forms(self):
+        from pyramid_deform import form_cache
+        form_cache.clear()
+        wizard = self._makeWizard()
+        for i in range(2):
+            inst = self._makeOne(wizard)
+            inst.cache_forms = True
+            result = inst(DummyRequest())
+            self.assertTrue('name="a"' in result['form'])
+            self.assertTrue(inst.schema is wizard.schemas[0])
+        self.assertEqual((form_cache.hits, form_cache.misses), (1, 1))
+        form_cache.clear()
+
     def test___call__step_zero_one_schema(self):
         schema = DummySchema()
         wizard = DummyFormWizard(schema)
@@ -173,6 +1288,18 @@ class TestFormWizardView(unittest.TestCase):
         result = inst(request)
         self.assertEqual(result, 'viewed')
 
+    def test___call__incremental_bind(self):
+        schema = make_csrf_schema()
+        wizard = DummyFormWizard(schema)
+        inst = self._makeOne(wizard)
+        inst.form_view_class = DummyFormView
+        inst.incremental_bind = True
+        request = DummyRequest()
+        result = inst(request)
+        self.assertEqual(result, 'viewed')
+        self.assertTrue(inst.schema['name'] is schema['name'])
+        self.assertEqual(inst.schema['csrf_token'].default, 'csrf_token')
+
     def test___call__next_not_ok(self):
         schema = DummySchema()
         schema.next_ok = lambda *arg: False
@@ -235,10 +1362,13 @@ class TestFormWizardView(unittest.TestCase):
         result = inst.next_success({'one':'one'})
         self.assertEqual(result.status, '302 Found')
         self.assertEqual(result.location, 'http://example.com')
+        inst.wizard_state.flush()
         state = request.session['pyramid_deform.wizards']['name']
         self.assertEqual(state['step'], 1)
         self.assertEqual(state['states'][0], {'one':'one'})
-        self.assertEqual(state['states']['schema'], {'one':'one'})
+        self.assertFalse('schema' in state['states'])
+        self.assertEqual(inst.wizard_state.get_step_states()['schema'],
+                         {'one':'one'})
 
     def test_next_success_with_serializer(self):
         from pyramid_deform import WizardState
@@ -252,10 +1382,13 @@ class TestFormWizardView(unittest.TestCase):
         result = inst.next_success({'one':'one'})
         self.assertEqual(result.status, '302 Found')
         self.assertEqual(result.location, 'http://example.com')
+        inst.wizard_state.flush()
         state = request.session['pyramid_deform.wizards']['name']
         self.assertEqual(state['step'], 1)
         self.assertEqual(state['states'][0], 'state2')
-        self.assertEqual(state['states']['schema'], 'state2')
+        self.assertFalse('schema' in state['states'])
+        self.assertEqual(inst.wizard_state.get_step_states()['schema'],
+                         'state2')
 
     def test_previous_success_at_step_zero(self):
         from pyramid_deform import WizardState
@@ -268,9 +1401,12 @@ class TestFormWizardView(unittest.TestCase):
         result = inst.previous_success({'one':'one'})
         self.assertEqual(result.status, '302 Found')
         self.assertEqual(result.location, 'http://example.com')
+        inst.wizard_state.flush()
         state = request.session['pyramid_deform.wizards']['name']
         self.assertEqual(state['states'][0], {'one':'one'})
-        self.assertEqual(state['states']['schema'], {'one':'one'})
+        self.assertFalse('schema' in state['states'])
+        self.assertEqual(inst.wizard_state.get_step_states()['schema'],
+                         {'one':'one'})
         self.assertFalse('step' in state)
 
     def test_previous_success_at_step_one(self):
@@ -288,7 +1424,9 @@ class TestFormWizardView(unittest.TestCase):
         self.assertEqual(result.location, 'http://example.com')
         state = request.session['pyramid_deform.wizards']['name']
         self.assertEqual(state['states'][1], {'one':'one'})
-        self.assertEqual(state['states']['schema'], {'one':'one'})
+        self.assertFalse('schema' in state['states'])
+        self.assertEqual(inst.wizard_state.get_step_states()['schema'],
+                         {'one':'one'})
         self.assertEqual(state['step'], 0)
 
     def test_previous_success_with_serializer(self):
@@ -303,9 +1441,12 @@ class TestFormWizardView(unittest.TestCase):
         result = inst.previous_success({'one':'one'})
         self.assertEqual(result.status, '302 Found')
         self.assertEqual(result.location, 'http://example.com')
+        inst.wizard_state.flush()
         state = request.session['pyramid_deform.wizards']['name']
         self.assertEqual(state['states'][0], 'state2')
-        self.assertEqual(state['states']['schema'], 'state2')
+        self.assertFalse('schema' in state['states'])
+        self.assertEqual(inst.wizard_state.get_step_states()['schema'],
+                         'state2')
 
     def test_previous_failure_at_step_zero(self):
         from pyramid_deform import WizardState
@@ -318,8 +1459,7 @@ class TestFormWizardView(unittest.TestCase):
         result = inst.previous_failure(None)
         self.assertEqual(result.status, '302 Found')
         self.assertEqual(result.location, 'http://example.com')
-        state = request.session['pyramid_deform.wizards']['name']
-        self.assertFalse('step' in state)
+        self.assertFalse('pyramid_deform.wizards' in request.session)
 
     def test_previous_failure_at_step_one(self):
         from pyramid_deform import WizardState
@@ -337,6 +1477,17 @@ class TestFormWizardView(unittest.TestCase):
         state = request.session['pyramid_deform.wizards']['name']
         self.assertEqual(state['step'], 0)
 
+    def test_get_summary(self):
+        from pyramid_deform import FormWizard
+        from pyramid_deform import WizardState
+        wizard = FormWizard('name', None, DummySchema(), DummySchema())
+        inst = self._makeOne(wizard)
+        inst.request = DummyRequest()
+        inst.wizard_state = WizardState(inst.request, 'name')
+        inst.wizard_state.set_step_num(1)
+        summary = inst.get_summary()
+        self.assertEqual([s['current'] for s in summary], [False, True])
+
     def test_get_schema_serializer_no_serializer(self):
         wizard = DummyFormWizard()
         inst = self._makeOne(wizard)
@@ -374,8 +1525,28 @@ class TestWizardState(unittest.TestCase):
         inst = self._makeOne(request)
         data = inst._get_wizard_data()
         self.assertEqual(data, {})
-        self.assertTrue('name' in request.session['pyramid_deform.wizards'])
-        self.assertTrue(request.session._changed)
+        self.assertFalse('pyramid_deform.wizards' in request.session)
+        self.assertFalse(inst.dirty)
+        inst.flush()
+        self.assertFalse(request.session._changed)
+
+    def test_read_only_use_leaves_session_alone(self):
+        request = DummyRequest()
+        inst = self._makeOne(request)
+        self.assertEqual(inst.get_step_num(), 0)
+        self.assertEqual(inst.get_step_state(), {})
+        inst.flush()
+        self.assertEqual(request.session, {})
+        self.assertFalse(request.session._changed)
+
+    def test_clear_removes_stored_data(self):
+        request = DummyRequest()
+        request.session['pyramid_deform.wizards'] = {'name': {'step':1}}
+        inst = self._makeOne(request)
+        inst.clear()
+        inst.flush()
+        self.assertEqual(request.session['pyramid_deform.wizards'], {})
+        self.assertEqual(request.session.changed_count, 1)
 
     def test__get_wizard_data_with_existing_data(self):
         request = DummyRequest()
@@ -388,6 +1559,40 @@ class TestWizardState(unittest.TestCase):
         self.assertEqual(data, state)
         self.assertFalse(request.session._changed)
 
+    def test_session_read_once(self):
+        request = DummyRequest()
+        inst = self._makeOne(request)
+        inst.set_step_num(1)
+        request.session['pyramid_deform.wizards'] = {}
+        self.assertEqual(inst.get_step_num(), 1)
+
+    def test_flush_changed_once(self):
+        request = DummyRequest()
+        inst = self._makeOne(request)
+        inst.set_state('schema', 'state')
+        inst.increment_step()
+        inst.set_state('schema', 'state')
+        self.assertEqual(request.session.changed_count, 0)
+        inst.flush()
+        inst.flush()
+        self.assertEqual(request.session.changed_count, 1)
+
+    def test_flush_on_response(self):
+        request = DummyRequest()
+        inst = self._makeOne(request)
+        inst.increment_step()
+        inst.increment_step()
+        self.assertEqual(len(request.response_callbacks), 1)
+        request.response_callbacks[0](request, None)
+        self.assertEqual(request.session.changed_count, 1)
+
+    def test_set_step_num_unchanged(self):
+        request = DummyRequest()
+        inst = self._makeOne(request)
+        request.session['pyramid_deform.wizards'] = {'name': {'step':1}}
+        inst.set_step_num(1)
+        self.assertFalse(inst.dirty)
+
     def test_clear(self):
         request = DummyRequest()
         inst = self._makeOne(request)
@@ -405,6 +1610,13 @@ class TestWizardState(unittest.TestCase):
         inst.request = request
         self.assertEqual(inst.get_step_num(), 1)
 
+    def test_get_step_num_from_params_once(self):
+        request = DummyRequest()
+        inst = self._makeOne(request)
+        request.GET['step'] = '1'
+        inst.increment_step()
+        self.assertEqual(inst.get_step_num(), 2)
+
     def test_clear_get_step_num_from_session(self):
         request = DummyRequest()
         inst = self._makeOne(request)
@@ -421,12 +1633,51 @@ class TestWizardState(unittest.TestCase):
         self.assertEqual(inst.get_step_num(), 5)
 
     def test_get_step_states(self):
+        from pyramid_deform import WizardState
         request = DummyRequest()
-        inst = self._makeOne(request)
+        inst = WizardState(request, 'name', step_names=('one', 'two'))
         states = request.session['pyramid_deform.wizards'] = {}
-        states['name'] = {'states':'states', 'step':0}
-        inst.request = request
-        self.assertEqual(inst.get_step_states(), 'states')
+        states['name'] = {'states':{0:'state'}, 'step':0}
+        result = inst.get_step_states()
+        self.assertEqual(result, {0:'state', 'one':'state'})
+        self.assertEqual(len(result), 2)
+        self.assertEqual(result['one'], 'state')
+        self.assertRaises(KeyError, result.__getitem__, 'two')
+        self.assertRaises(KeyError, result.__getitem__, 1)
+        def assign():
+            result[1] = 'state'
+        self.assertRaises(TypeError, assign)
+
+    def test_get_step_states_migrates_old_format(self):
+        from pyramid_deform import WizardState
+        request = DummyRequest()
+        inst = WizardState(request, 'name', step_names=('one', 'two'))
+        states = request.session['pyramid_deform.wizards'] = {}
+        states['name'] = {'states':{0:'state', 'one':'state', 'two':'other',
+                                    'unknown':'kept'}, 'step':0}
+        inst.get_step_states()
+        self.assertEqual(states['name']['states'],
+                         {0:'state', 1:'other', 'unknown':'kept'})
+        self.assertTrue(inst.dirty)
+
+    def test_get_step_states_json_session(self):
+        import json
+        from pyramid_deform import WizardState
+        request = DummyRequest()
+        inst = WizardState(request, 'name', step_names=('one', 'two'))
+        inst.set_step_state(0, 'one', {'a': 1})
+        inst.set_step_state(1, 'two', {'b': 2})
+        inst.flush()
+        # as with SignedCookieSessionFactory's default serializer
+        wizards = json.loads(json.dumps(
+            request.session['pyramid_deform.wizards']))
+        request = DummyRequest()
+        request.session['pyramid_deform.wizards'] = wizards
+        inst = WizardState(request, 'name', step_names=('one', 'two'))
+        self.assertEqual(dict(inst.get_step_states()),
+                         {0: {'a': 1}, 'one': {'a': 1},
+                          1: {'b': 2}, 'two': {'b': 2}})
+        self.assertEqual(inst.get_step_state(), {'a': 1})
 
     def test_get_step_state(self):
         request = DummyRequest()
@@ -450,8 +1701,180 @@ class TestWizardState(unittest.TestCase):
         states['name'] = {'states':{0:'state'}, 'step':0}
         inst.request = request
         inst.set_step_state(0, 'schema', 'state2')
-        self.assertEqual(states['name']['states'][0], 'state2')
-        self.assertEqual(states['name']['states']['schema'], 'state2')
+        self.assertEqual(states['name']['states'], {0:'state2'})
+        self.assertEqual(inst.get_step_states()['schema'], 'state2')
+
+    def test_store_from_registry(self):
+        from pyramid.registry import Registry
+        from pyramid_deform import MemoryWizardStateStore
+        request = DummyRequest()
+        request.registry = Registry('test')
+        store = request.registry.pyramid_deform_wizard_store = \
+            MemoryWizardStateStore()
+        inst = self._makeOne(request)
+        self.assertTrue(inst.store is store)
+        inst.set_state('schema', 'state')
+        inst.flush()
+        self.assertFalse('pyramid_deform.wizards' in request.session)
+        inst = self._makeOne(request)
+        self.assertEqual(inst.get_step_state(), 'state')
+
+class TestSessionWizardStateStore(unittest.TestCase):
+    def _makeOne(self):
+        from pyramid_deform import SessionWizardStateStore
+        return SessionWizardStateStore()
+
+    def test_load_save(self):
+        request = DummyRequest()
+        inst = self._makeOne()
+        wizdata = inst.load(request, 'name')
+        self.assertEqual(wizdata, {})
+        wizdata['step'] = 1
+        inst.save(request, 'name', wizdata)
+        self.assertEqual(request.session['pyramid_deform.wizards'],
+                         {'name': {'step': 1}})
+        self.assertTrue(request.session._changed)
+
+class TestMemoryWizardStateStore(unittest.TestCase):
+    def _makeOne(self, **kw):
+        from pyramid_deform import MemoryWizardStateStore
+        return MemoryWizardStateStore(**kw)
+
+    def test_load_no_token(self):
+        request = DummyRequest()
+        inst = self._makeOne()
+        self.assertEqual(inst.load(request, 'name'), {})
+        self.assertFalse('pyramid_deform.wizard_token' in request.session)
+
+    def test_save_load(self):
+        request = DummyRequest()
+        inst = self._makeOne()
+        inst.save(request, 'name', {'step': 1})
+        self.assertEqual(list(request.session.keys()),
+                         ['pyramid_deform.wizard_token'])
+        self.assertEqual(inst.load(request, 'name'), {'step': 1})
+        self.assertEqual(inst.load(request, 'other'), {})
+        self.assertEqual(inst.load(DummyRequest(), 'name'), {})
+
+    def test_save_empty_removes(self):
+        request = DummyRequest()
+        inst = self._makeOne()
+        inst.save(request, 'name', {'step': 1})
+        inst.save(request, 'name', {})
+        self.assertEqual(len(inst.entries), 0)
+
+    def test_clear_creates_no_token(self):
+        request = DummyRequest()
+        inst = self._makeOne()
+        inst.save(request, 'name', {})
+        self.assertFalse('pyramid_deform.wizard_token' in request.session)
+
+    def test_expired(self):
+        request = DummyRequest()
+        inst = self._makeOne(ttl=-1)
+        inst.save(request, 'name', {'step': 1})
+        self.assertEqual(inst.load(request, 'name'), {})
+        self.assertEqual(len(inst.entries), 0)
+
+    def test_maxsize(self):
+        inst = self._makeOne(maxsize=1)
+        request1 = DummyRequest()
+        request2 = DummyRequest()
+        inst.save(request1, 'name', {'step': 1})
+        inst.save(request2, 'name', {'step': 2})
+        self.assertEqual(inst.load(request1, 'name'), {})
+        self.assertEqual(inst.load(request2, 'name'), {'step': 2})
+
+class TestWizardStateStoreInterface(unittest.TestCase):
+    def test_stores_implement_interface(self):
+        from zope.interface.verify import verifyObject
+        from pyramid_deform import IWizardStateStore
+        from pyramid_deform import FileWizardStateStore
+        from pyramid_deform import MemoryWizardStateStore
+        from pyramid_deform import SessionWizardStateStore
+        tempdir = tempfile.mkdtemp()
+        try:
+            for store in (SessionWizardStateStore(),
+                          MemoryWizardStateStore(),
+                          FileWizardStateStore(tempdir)):
+                self.assertTrue(verifyObject(IWizardStateStore, store))
+        finally:
+            shutil.rmtree(tempdir)
+
+class TestFileWizardStateStore(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def _makeOne(self, **kw):
+        from pyramid_deform import FileWizardStateStore
+        return FileWizardStateStore(os.path.join(self.tempdir, 'wiz'), **kw)
+
+    def test_load_no_token(self):
+        inst = self._makeOne()
+        self.assertEqual(inst.load(DummyRequest(), 'name'), {})
+
+    def test_save_load(self):
+        request = DummyRequest()
+        inst = self._makeOne()
+        inst.save(request, 'name', {'step': 1, 'states': {0: 'state'}})
+        self.assertEqual(len(os.listdir(inst.directory)), 1)
+        self.assertEqual(inst.load(request, 'name'),
+                         {'step': 1, 'states': {0: 'state'}})
+        self.assertEqual(inst.load(request, 'other'), {})
+        inst.save(request, 'name', {})
+        self.assertEqual(os.listdir(inst.directory), [])
+
+    def test_expired(self):
+        request = DummyRequest()
+        inst = self._makeOne(ttl=-1)
+        inst.save(request, 'name', {'step': 1})
+        self.assertEqual(inst.load(request, 'name'), {})
+        self.assertEqual(os.listdir(inst.directory), [])
+
+    def test_reap(self):
+        inst = self._makeOne(ttl=60)
+        inst.save(DummyRequest(), 'old', {'step': 1})
+        name = os.listdir(inst.directory)[0]
+        os.utime(os.path.join(inst.directory, name), (0, 0))
+        inst.save(DummyRequest(), 'new', {'step': 1})
+        self.assertEqual(inst.reap(), 1)
+        self.assertEqual(len(os.listdir(inst.directory)), 1)
+        self.assertFalse(name in os.listdir(inst.directory))
+
+    def test_reap_foreign_files(self):
+        inst = self._makeOne(ttl=60)
+        inst.save(DummyRequest(), 'old', {'step': 1})
+        name = os.listdir(inst.directory)[0]
+        names = [name, name + '.0123abcd', 'README', name + '.bak',
+                 name.upper()]
+        for other in names[1:]:
+            with open(os.path.join(inst.directory, other), 'wb'):
+                pass
+        for other in names:
+            os.utime(os.path.join(inst.directory, other), (0, 0))
+        self.assertEqual(inst.reap(), 2)
+        self.assertEqual(sorted(os.listdir(inst.directory)),
+                         sorted(names[2:]))
+
+    def test_save_reaps(self):
+        inst = self._makeOne(ttl=60, reap_interval=0)
+        inst.save(DummyRequest(), 'old', {'step': 1})
+        name = os.listdir(inst.directory)[0]
+        os.utime(os.path.join(inst.directory, name), (0, 0))
+        inst.save(DummyRequest(), 'new', {'step': 1})
+        names = os.listdir(inst.directory)
+        self.assertEqual(len(names), 1)
+        self.assertNotEqual(names, [name])
+
+    def test_clear_creates_no_token(self):
+        request = DummyRequest()
+        inst = self._makeOne()
+        inst.save(request, 'name', {})
+        self.assertFalse('pyramid_deform.wizard_token' in request.session)
+        self.assertEqual(os.listdir(inst.directory), [])
 
 class TestFormWizard(unittest.TestCase):
     def _makeOne(self, name, done, *schemas):
@@ -459,12 +1882,24 @@ class TestFormWizard(unittest.TestCase):
         return FormWizard(name, done, *schemas)
     
     def test___call__(self):
-        inst = self._makeOne('name', None, 'schema1', 'schema2')
+        inst = self._makeOne('name', None, DummySchema(), DummySchema())
         inst.form_wizard_view_class = DummyFormWizardView
         request = DummyRequest()
         result = inst(request)
         self.assertEqual(result.wizard, inst)
 
+    def test_step_buttons(self):
+        inst = self._makeOne('name', None, DummySchema(), DummySchema())
+        self.assertEqual(inst.step_names, ('schema', 'schema'))
+        first = inst.step_buttons[0]
+        self.assertEqual(sorted(first), [(False, False), (False, True),
+                                         (True, False), (True, True)])
+        self.assertEqual([b.name for b in first[(False, False)]], ['next'])
+        last = inst.step_buttons[1][(True, False)]
+        self.assertEqual([(b.name, b.title, b.disabled) for b in last],
+                         [('previous', 'Previous', True),
+                          ('next', 'Done', False)])
+
     def test_get_summary(self):
         schema1 = DummySchema()
         schema2 = DummySchema()
@@ -493,6 +1928,29 @@ class TestFormWizard(unittest.TestCase):
               'desc': 'desc'}
              ])
 
+    def test_get_summary_current_step(self):
+        schema1 = DummySchema()
+        schema2 = DummySchema()
+        inst = self._makeOne('name', None, schema1, schema2)
+        request = DummyRequest()
+        request.session['pyramid_deform.wizards'] = {'name': {'step':1}}
+        summary = inst.get_summary(request)
+        self.assertEqual([(s['current'], s['class']) for s in summary],
+                         [(False, 'first'), (True, 'last hilight')])
+        summary[0]['current'] = True
+        self.assertFalse('current' in inst.summary[0][0])
+
+    def test_get_summary_with_state(self):
+        from pyramid_deform import MemoryWizardStateStore
+        from pyramid_deform import WizardState
+        inst = self._makeOne('name', None, DummySchema(), DummySchema())
+        request = DummyRequest()
+        # unflushed, so only visible through this state
+        state = WizardState(request, 'name', store=MemoryWizardStateStore())
+        state.set_step_num(1)
+        summary = inst.get_summary(request, state)
+        self.assertEqual([s['current'] for s in summary], [False, True])
+
 class TestCRSFSchema(unittest.TestCase):
     def _getTargetClass(self):
         from pyramid_deform import CSRFSchema
@@ -631,6 +2089,394 @@ class TestSessionFileUploadTempStore(unittest.TestCase):
         inst.tempstore['a'] = {}
         self.assertEqual(inst['a'], {})
 
+    def test_chunk_size_setting(self):
+        request = self._makeRequest()
+        self.assertEqual(self._makeOne(request).chunk_size, 1 << 20)
+        request.registry.settings['pyramid_deform.tempstore_chunk_size'] = '5'
+        self.assertEqual(self._makeOne(request).chunk_size, 5)
+
+    def test_setitem_async(self):
+        request = self._makeRequest()
+        request.registry.settings['pyramid_deform.tempstore_async'] = 'true'
+        inst = self._makeOne(request)
+        source = tempfile.TemporaryFile()
+        source.write(b'skipped' + b'x' * 1000000)
+        source.seek(7)
+        inst['a'] = {'fp': source, 'filename': 'x.txt'}
+        # WebOb closes uploads at the end of the request
+        source.close()
+        data = inst['a']
+        with data['fp'] as f:
+            self.assertEqual(f.read(), b'x' * 1000000)
+        self.assertEqual(data['filename'], 'x.txt')
+        self.assertEqual(os.listdir(self.tempdir), [data['randid']])
+
+    def test_setitem_async_not_a_file(self):
+        request = self._makeRequest()
+        request.registry.settings['pyramid_deform.tempstore_async'] = 'true'
+        inst = self._makeOne(request)
+        inst['a'] = {'fp': io.BytesIO(b'abc')}
+        randid = inst.tempstore['a']['randid']
+        self.assertEqual(os.listdir(self.tempdir), [randid])
+        with inst['a']['fp'] as f:
+            self.assertEqual(f.read(), b'abc')
+
+    def test_get_async_write_failed(self):
+        request = self._makeRequest()
+        request.registry.settings['pyramid_deform.tempstore_async'] = 'true'
+        inst = self._makeOne(request)
+        with tempfile.TemporaryFile() as source:
+            with patch('pyramid_deform.tempstore.copy_stream',
+                       side_effect=IOError('disk full')):
+                inst['a'] = {'fp': source}
+                self.assertRaises(IOError, inst.get, 'a')
+        self.assertEqual(os.listdir(self.tempdir), [])
+        self.assertEqual(inst['a'].get('fp'), None)
+
+    def test_async_write_failed_not_pending(self):
+        from pyramid_deform.tempstore import _pending_writes
+        request = self._makeRequest()
+        request.registry.settings['pyramid_deform.tempstore_async'] = 'true'
+        inst = self._makeOne(request)
+        with tempfile.TemporaryFile() as source:
+            with patch('pyramid_deform.tempstore.copy_stream',
+                       side_effect=IOError('disk full')):
+                inst['a'] = {'fp': source}
+                fn = os.path.join(self.tempdir, inst.tempstore['a']['randid'])
+                for num in range(100):
+                    if fn not in _pending_writes:
+                        break
+                    time.sleep(0.01)
+        # failed writes are not kept in memory but beside the file
+        self.assertFalse(fn in _pending_writes)
+        self.assertEqual(os.listdir(self.tempdir),
+                         [os.path.basename(fn) + '.failed'])
+        try:
+            inst.get('a')
+        except IOError as e:
+            self.assertTrue('disk full' in str(e))
+        else:
+            self.fail('IOError not raised')
+        self.assertEqual(os.listdir(self.tempdir), [])
+
+    def test_get_async_waits_for_other_process(self):
+        import threading
+        request = self._makeRequest()
+        request.registry.settings['pyramid_deform.tempstore_async'] = 'true'
+        inst = self._makeOne(request)
+        fn = os.path.join(self.tempdir, '1234')
+        with open(fn + '.part', 'wb') as f:
+            f.write(b'abc')
+        timer = threading.Timer(0.1, os.rename, (fn + '.part', fn))
+        timer.start()
+        inst.tempstore['a'] = {'randid': '1234'}
+        with inst['a']['fp'] as f:
+            self.assertEqual(f.read(), b'abc')
+        timer.join()
+
+    def test_setitem_links_named_file(self):
+        request = self._makeRequest()
+        inst = self._makeOne(request)
+        with tempfile.NamedTemporaryFile(dir=self.tempdir) as source:
+            source.write(b'abc')
+            source.seek(0)
+            inst['a'] = {'fp': source, 'filename': 'x.txt'}
+            randid = inst.tempstore['a']['randid']
+            fn = os.path.join(self.tempdir, randid)
+            self.assertTrue(os.path.samefile(fn, source.name))
+        with inst['a']['fp'] as f:
+            self.assertEqual(f.read(), b'abc')
+        self.assertEqual(os.listdir(self.tempdir), [randid])
+
+    def test_setitem_link_unsupported(self):
+        request = self._makeRequest()
+        inst = self._makeOne(request)
+        with tempfile.NamedTemporaryFile(dir=self.tempdir) as source:
+            source.write(b'abc')
+            source.seek(0)
+            import errno
+            with patch('os.link', side_effect=OSError(errno.EPERM, 'no')):
+                inst['a'] = {'fp': source, 'filename': 'x.txt'}
+            fn = os.path.join(self.tempdir, inst.tempstore['a']['randid'])
+            self.assertFalse(os.path.samefile(fn, source.name))
+        with inst['a']['fp'] as f:
+            self.assertEqual(f.read(), b'abc')
+
+    def test_reaper(self):
+        from pyramid_deform import TempstoreReaper
+        request = self._makeRequest()
+        reaper = TempstoreReaper(self.tempdir, interval=0)
+        request.registry.pyramid_deform_tempstore_reaper = reaper
+        inst = self._makeOne(request)
+        self.assertEqual(inst.bytes_on_disk, 0)
+        inst['a'] = {'fp': io.BytesIO(b'abc')}
+        self.assertEqual(inst.bytes_on_disk, 3)
+        fn = os.path.join(self.tempdir, inst.tempstore['a']['randid'])
+        os.utime(fn, (0, 0))
+        inst['a']['fp'].close()
+        self.assertTrue(os.path.getmtime(fn) > 0)
+        reaper.reap(now=time.time() + reaper.ttl + 1)
+        self.assertEqual(inst.files_reaped, 1)
+        self.assertEqual(inst.bytes_on_disk, 0)
+        self.assertEqual(inst['a'].get('fp'), None)
+
+    def test_no_reaper(self):
+        inst = self._makeOne(self._makeRequest())
+        self.assertEqual(inst.bytes_on_disk, None)
+        self.assertEqual(inst.files_reaped, None)
+
+class TestTempstoreReaper(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def _makeOne(self, **kw):
+        from pyramid_deform import TempstoreReaper
+        kw.setdefault('interval', 0)
+        return TempstoreReaper(self.tempdir, **kw)
+
+    def _name(self, name):
+        # the reaper only considers names like those of the temporary store
+        base, dot, suffix = name.partition('.')
+        return hashlib.sha1(base.encode('ascii')).hexdigest() + dot + suffix
+
+    def _write(self, name, size, mtime):
+        fn = os.path.join(self.tempdir, self._name(name))
+        with open(fn, 'wb') as f:
+            f.write(b'x' * size)
+        os.utime(fn, (mtime, mtime))
+        return fn
+
+    def test_reap_expired(self):
+        now = time.time()
+        self._write('old', 10, now - 100)
+        self._write('new', 20, now - 10)
+        inst = self._makeOne(ttl=50)
+        self.assertEqual(inst.reap(now), 1)
+        self.assertEqual(os.listdir(self.tempdir), [self._name('new')])
+        self.assertEqual(inst.bytes_on_disk, 20)
+        self.assertEqual(inst.files_reaped, 1)
+        self.assertEqual(inst.bytes_reaped, 10)
+
+    def test_reap_over_quota(self):
+        now = time.time()
+        self._write('a', 10, now - 30)
+        self._write('b.part', 10, now - 20)
+        self._write('c', 10, now - 10)
+        self._write('d', 10, now)
+        inst = self._makeOne(max_bytes=25)
+        self.assertEqual(inst.reap(now), 2)
+        self.assertEqual(sorted(os.listdir(self.tempdir)),
+                         sorted([self._name('b.part'), self._name('d')]))
+        self.assertEqual(inst.bytes_on_disk, 20)
+
+    def test_stored_over_quota(self):
+        now = time.time()
+        self._write('a', 10, now - 10)
+        inst = self._makeOne(max_bytes=15)
+        inst.stored(os.path.join(self.tempdir, self._name('a')))
+        self.assertEqual(inst.bytes_on_disk, 10)
+        inst.stored(self._write('b', 10, now))
+        self.assertEqual(os.listdir(self.tempdir), [self._name('b')])
+        self.assertEqual(inst.bytes_on_disk, 10)
+        self.assertEqual(inst.files_reaped, 1)
+
+    def test_reap_foreign_files(self):
+        now = time.time()
+        self._write('old', 10, now - 100)
+        self._write('old.part', 10, now - 100)
+        for name in ('README', 'a' * 40 + '.bak', 'A' * 40):
+            fn = os.path.join(self.tempdir, name)
+            with open(fn, 'wb') as f:
+                f.write(b'x' * 10)
+            os.utime(fn, (now - 100, now - 100))
+        inst = self._makeOne(ttl=50)
+        self.assertEqual(inst.reap(now), 2)
+        self.assertEqual(sorted(os.listdir(self.tempdir)),
+                         ['A' * 40, 'README', 'a' * 40 + '.bak'])
+        self.assertEqual(inst.bytes_on_disk, 0)
+
+    def test_stored_missing(self):
+        inst = self._makeOne()
+        inst.stored(os.path.join(self.tempdir, 'missing'))
+        self.assertEqual(inst.bytes_on_disk, 0)
+
+    def test_thread(self):
+        self._write('old', 10, 0)
+        inst = self._makeOne(ttl=50, max_bytes=15, interval=60)
+        inst.start()
+        try:
+            inst.start()
+            for num in range(100):
+                if not os.listdir(self.tempdir):
+                    break
+                time.sleep(0.01)
+            self.assertEqual(os.listdir(self.tempdir), [])
+            inst.stored(self._write('a', 10, time.time() - 10))
+            inst.stored(self._write('b', 10, time.time()))
+            for num in range(100):
+                if inst.files_reaped == 2:
+                    break
+                time.sleep(0.01)
+            self.assertEqual(os.listdir(self.tempdir), [self._name('b')])
+        finally:
+            inst.stop()
+        self.assertEqual(inst._thread, None)
+
+    def test_thread_disabled(self):
+        inst = self._makeOne()
+        inst.start()
+        self.assertEqual(inst._thread, None)
+        inst.stop()
+
+class Test_tempstore_reaper(unittest.TestCase):
+    def _callFUT(self, settings):
+        from pyramid_deform import tempstore_reaper
+        return tempstore_reaper(settings)
+
+    def test_not_configured(self):
+        self.assertEqual(self._callFUT({}), None)
+        self.assertEqual(
+            self._callFUT({'pyramid_deform.tempdir': '/tmp/x'}), None)
+
+    def test_ttl(self):
+        reaper = self._callFUT({'pyramid_deform.tempdir': ' /tmp/x ',
+                                'pyramid_deform.tempstore_ttl': '60'})
+        self.assertEqual(reaper.directory, '/tmp/x')
+        self.assertEqual(reaper.ttl, 60)
+        self.assertEqual(reaper.max_bytes, None)
+        self.assertEqual(reaper.interval, 300)
+
+    def test_max_bytes(self):
+        reaper = self._callFUT(
+            {'pyramid_deform.tempdir': '/tmp/x',
+             'pyramid_deform.tempstore_max_bytes': '1000',
+             'pyramid_deform.tempstore_reap_interval': '0'})
+        self.assertEqual(reaper.ttl, 86400)
+        self.assertEqual(reaper.max_bytes, 1000)
+        self.assertEqual(reaper.interval, 0)
+
+class Test_reap_tempstore(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def _callFUT(self, settings):
+        from pyramid_deform import reap_tempstore
+        with patch('pyramid.paster.get_appsettings',
+                   return_value=settings) as get_appsettings:
+            with patch('sys.stdout', new_callable=io.StringIO) as out:
+                reap_tempstore(['reap_deform_tempstore', 'test.ini'])
+        get_appsettings.assert_called_with('test.ini')
+        return out.getvalue()
+
+    def test_reap(self):
+        fn = os.path.join(self.tempdir, 'a' * 40)
+        with open(fn, 'wb') as f:
+            f.write(b'abc')
+        os.utime(fn, (0, 0))
+        output = self._callFUT({'pyramid_deform.tempdir': self.tempdir,
+                                'pyramid_deform.tempstore_ttl': '60'})
+        self.assertEqual(output, '1 files removed, 0 bytes left\n')
+        self.assertEqual(os.listdir(self.tempdir), [])
+
+    def test_not_configured(self):
+        with patch('sys.stderr', new_callable=io.StringIO):
+            self.assertRaises(SystemExit, self._callFUT, {})
+
+class Test_linkable_path(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def _callFUT(self, source, directory=None):
+        from pyramid_deform import linkable_path
+        return linkable_path(source, directory or self.tempdir)
+
+    def test_named_file(self):
+        with tempfile.NamedTemporaryFile(dir=self.tempdir) as source:
+            source.write(b'abc')
+            source.seek(0)
+            self.assertEqual(self._callFUT(source), source.name)
+
+    def test_not_at_start(self):
+        with tempfile.NamedTemporaryFile(dir=self.tempdir) as source:
+            source.write(b'abc')
+            self.assertEqual(self._callFUT(source), None)
+
+    def test_anonymous_file(self):
+        with tempfile.TemporaryFile(dir=self.tempdir) as source:
+            self.assertEqual(self._callFUT(source), None)
+
+    def test_name_replaced(self):
+        with tempfile.NamedTemporaryFile(dir=self.tempdir,
+                                         delete=False) as source:
+            os.remove(source.name)
+            with open(source.name, 'wb'):
+                pass
+            self.assertEqual(self._callFUT(source), None)
+
+    def test_other_filesystem(self):
+        with tempfile.NamedTemporaryFile(dir=self.tempdir) as source:
+            st = os.stat(self.tempdir)
+            other = os.stat_result(
+                st[:2] + (st.st_dev + 1,) + st[3:])
+            real_stat = os.stat
+            def stat(path):
+                if path == self.tempdir:
+                    return other
+                return real_stat(path)
+            with patch('os.stat', stat):
+                self.assertEqual(self._callFUT(source), None)
+
+    def test_bytesio(self):
+        import io
+        self.assertEqual(self._callFUT(io.BytesIO(b'abc')), None)
+
+class Test_copy_stream(unittest.TestCase):
+    def _callFUT(self, source, out, chunk_size=7):
+        from pyramid_deform import copy_stream
+        return copy_stream(source, out, chunk_size)
+
+    def _copy(self, source):
+        with tempfile.TemporaryFile() as out:
+            self._callFUT(source, out)
+            out.seek(0)
+            return out.read()
+
+    def test_file(self):
+        with tempfile.TemporaryFile() as source:
+            source.write(b'skipped' + b'0123456789' * 10)
+            source.seek(7)
+            self.assertEqual(self._copy(source), b'0123456789' * 10)
+            self.assertEqual(source.read(), b'')
+
+    def test_sendfile_unsupported(self):
+        with tempfile.TemporaryFile() as source:
+            source.write(b'0123456789' * 10)
+            source.seek(0)
+            with patch('os.sendfile', side_effect=OSError(), create=True):
+                self.assertEqual(self._copy(source), b'0123456789' * 10)
+
+    def test_bytesio(self):
+        import io
+        self.assertEqual(self._copy(io.BytesIO(b'0123456789' * 10)),
+                         b'0123456789' * 10)
+
+    def test_read_only(self):
+        import io
+        class Stream(object):
+            def __init__(self, data):
+                self.read = io.BytesIO(data).read
+        self.assertEqual(self._copy(Stream(b'0123456789' * 10)),
+                         b'0123456789' * 10)
+
 class DummyForm(object):
     def __init__(self, schema, buttons=None, use_ajax=False, ajax_options='',
                  formid='deform', action='', method='POST', **kw):
@@ -653,6 +2499,13 @@ class DummyForm(object):
     def validate(self, controls):
         return 'validated'
 
+def make_csrf_schema():
+    import colander
+    from pyramid_deform import CSRFSchema
+    class Schema(CSRFSchema):
+        name = colander.SchemaNode(colander.String())
+    return Schema()
+
 class DummySchema(object):
     name = 'schema'
     description = 'desc'
@@ -683,8 +2536,10 @@ class DummyFormWizard(object):
 
 class DummySession(dict):
     _changed = False
+    changed_count = 0
     def changed(self):
         self._changed = True
+        self.changed_count += 1
 
     def get_csrf_token(self):
         return 'csrf_token'
@@ -695,10 +2550,13 @@ class DummyRequest(testing.DummyRequest):
         self.session = DummySession()
     
 class DummyFormView(object):
+    form_options = ()
+
     def __init__(self, request):
         self.request = request
 
     def __call__(self):
+        self.request.form_view = self
         return 'viewed'
         
 class DummySerializer(object):
@@ -711,6 +2569,110 @@ class DummySerializer(object):
     def serialize(self, state):
         return self.result
 
+class TestLazyImports(unittest.TestCase):
+    def test_import_does_not_load_deform(self):
+        import subprocess
+        script = ('import sys, pyramid_deform; '
+                  'print(sorted(set(["colander", "deform"]) & '
+                  'set(sys.modules)))')
+        output = subprocess.check_output(
+            [sys.executable, '-c', script],
+            cwd=os.path.dirname(os.path.dirname(__file__)))
+        self.assertEqual(output.strip(), b'[]')
+
+    def test_lazy_attributes(self):
+        import pyramid_deform
+        from pyramid_deform.csrf import CSRFSchema
+        from pyramid_deform.renderer import IndexedZPTRendererFactory
+        self.assertTrue(pyramid_deform.CSRFSchema is CSRFSchema)
+        self.assertTrue(pyramid_deform.IndexedZPTRendererFactory is
+                        IndexedZPTRendererFactory)
+        from deform.form import Button
+        self.assertTrue(pyramid_deform.Button is Button)
+        self.assertRaises(AttributeError, getattr, pyramid_deform, 'missing')
+
+    def test_lazy_module(self):
+        import colander
+        from pyramid_deform import _LazyModule
+        lazy = _LazyModule('colander')
+        self.assertTrue(lazy.null is colander.null)
+        self.assertTrue(lazy.interfaces is colander.interfaces)
+
+    def test_form_class(self):
+        import deform
+        from pyramid_deform import FormView
+        self.assertTrue(FormView.form_class is deform.Form)
+
+class Test_translator(unittest.TestCase):
+    def setUp(self):
+        from pyramid_deform import translation_cache
+        translation_cache.clear()
+        self.request = testing.DummyRequest()
+        self.config = testing.setUp(request=self.request)
+
+    def tearDown(self):
+        testing.tearDown()
+
+    def _callFUT(self, term):
+        from pyramid_deform import translator
+        return translator(term)
+
+    def test_no_request(self):
+        from translationstring import TranslationString
+        testing.tearDown()
+        term = TranslationString('Hello ${name}', mapping={'name': 'fred'})
+        self.assertEqual(self._callFUT(term), 'Hello fred')
+        self.assertEqual(self._callFUT('plain'), 'plain')
+
+    def test_untranslated(self):
+        from translationstring import TranslationString
+        from pyramid_deform import translation_cache
+        term = TranslationString('Required', domain='colander',
+                                 default='Needed')
+        self.assertEqual(self._callFUT(term), 'Needed')
+        self.assertEqual(translation_cache.misses, 0)
+
+    def test_translated_cached(self):
+        from translationstring import TranslationString
+        from pyramid_deform import translation_cache
+        self.config.add_translation_dirs('colander:locale')
+        self.request._LOCALE_ = 'fr'
+        term = TranslationString('Required', domain='colander')
+        self.assertEqual(self._callFUT(term), 'Requis')
+        self.assertEqual(self._callFUT(term), 'Requis')
+        self.assertEqual((translation_cache.misses, translation_cache.hits),
+                         (1, 1))
+
+    def test_cache_per_localizer(self):
+        from pyramid.i18n import make_localizer
+        from translationstring import TranslationString
+        from pyramid_deform import translation_cache
+        # same locale, different catalogs (as in two applications)
+        colander_fr = make_localizer('fr', [self._locale_dir('colander')])
+        deform_fr = make_localizer('fr', [self._locale_dir('deform')])
+        term = TranslationString('Required', domain='colander')
+        for localizer, expected in ((colander_fr, 'Requis'),
+                                    (deform_fr, 'Required'),
+                                    (colander_fr, 'Requis')):
+            self.request.localizer = localizer
+            self.assertEqual(self._callFUT(term), expected)
+        self.assertEqual((translation_cache.misses, translation_cache.hits),
+                         (2, 1))
+
+    def _locale_dir(self, package):
+        from pyramid.path import AssetResolver
+        return AssetResolver().resolve(package + ':locale').abspath()
+
+    def test_translated_unhashable_mapping(self):
+        from translationstring import TranslationString
+        from pyramid_deform import translation_cache
+        self.config.add_translation_dirs('colander:locale')
+        self.request._LOCALE_ = 'fr'
+        term = TranslationString('${val}', domain='colander',
+                                 mapping={'val': ['a']})
+        self.assertEqual(self._callFUT(term), "['a']")
+        self.assertEqual(translation_cache.misses, 0)
+
 class TestConfigureZPTRenderer(unittest.TestCase):
     @patch('deform.form.Form')
     def test_translator(self, Form):
@@ -733,6 +2695,287 @@ class TestConfigureZPTRenderer(unittest.TestCase):
         assert (search_path[-1],) == search_path_before
         assert search_path[0].endswith('deform' + os.path.sep + 'templates')
 
+class TestIndexedZPTRendererFactory(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def _write(self, name, text):
+        path = os.path.join(self.tempdir, *name.split('/'))
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+
+    def test_template_index(self):
+        from pyramid_deform import template_index
+        first = self._write('first/hello.pt', 'first')
+        self._write('second/hello.pt', 'second')
+        sub = self._write('second/readonly/hello.pt', 'readonly')
+        self._write('second/notes.txt', 'notes')
+        index = template_index([os.path.join(self.tempdir, 'first'),
+                                os.path.join(self.tempdir, 'second'),
+                                os.path.join(self.tempdir, 'missing')])
+        self.assertEqual(index, {'hello': first, 'readonly/hello': sub})
+
+    def test_load(self):
+        from pyramid_deform import IndexedZPTRendererFactory
+        self._write('hello.pt', '<p>Hello ${name}</p>')
+        renderer = IndexedZPTRendererFactory([self.tempdir])
+        self.assertEqual(renderer('hello', name='fred'), '<p>Hello fred</p>')
+        self.assertTrue(renderer.load('hello.pt') is renderer.load('hello'))
+        self._write('later.pt', '<p>Later</p>')
+        self.assertEqual(renderer('later'), '<p>Later</p>')
+
+    def test_renders_deform_forms(self):
+        import deform
+        from pyramid_deform import IndexedZPTRendererFactory
+        default = deform.Form.default_renderer
+        renderer = IndexedZPTRendererFactory(default.loader.search_path)
+        schema = make_csrf_schema().bind(request=DummyRequest())
+        expected = deform.Form(schema, formid='f').render()
+        rendered = deform.Form(schema, formid='f', renderer=renderer).render()
+        self.assertEqual(rendered.replace('deformField', ''),
+                         expected.replace('deformField', ''))
+
+class Test_warm_templates(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def _callFUT(self, renderer=None):
+        from pyramid_deform import warm_templates
+        return warm_templates(renderer)
+
+    def test_it(self):
+        import deform
+        os.mkdir(os.path.join(self.tempdir, 'readonly'))
+        for name in ('hello.pt', 'readonly/hello.pt', 'notes.txt'):
+            with open(os.path.join(self.tempdir, name), 'w') as f:
+                f.write('<p>${name}</p>')
+        renderer = deform.ZPTRendererFactory([self.tempdir])
+        self.assertEqual(self._callFUT(renderer), 2)
+        template = renderer.load('readonly/hello')
+        self.assertTrue(template._cooked)
+        self.assertTrue(renderer.load('hello') is renderer.load('hello'))
+
+    def test_default_renderer(self):
+        import deform
+        renderer = deform.Form.default_renderer
+        self.assertTrue(self._callFUT() > 20)
+        self.assertTrue(renderer.load('form')._cooked)
+
+class TestAssetBundler(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def _makeOne(self, static_prefix='../static-deform/'):
+        from pyramid_deform import AssetBundler
+        return AssetBundler(os.path.join(self.tempdir, 'bundles'),
+                            static_prefix)
+
+    def test_bundle_relative_names_warns(self):
+        import warnings
+        inst = self._makeOne()
+        resources = ['scripts/deform.js', 'scripts/jquery.form-3.09.js']
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            result = inst.bundle(resources, 'js')
+        self.assertEqual(result, tuple(resources))
+        self.assertEqual(len(caught), 1)
+
+    def test_bundle_js(self):
+        from pkg_resources import resource_filename
+        inst = self._makeOne()
+        resources = ['deform:static/scripts/deform.js',
+                     'deform:static/tinymce/tinymce.min.js',
+                     'other:static/other.js',
+                     'deform:static/scripts/jquery.form-3.09.js']
+        result = inst.bundle(resources, 'js')
+        self.assertEqual(len(result), 3)
+        path = result[0]
+        self.assertEqual(result[1:], tuple(resources[1:3]))
+        self.assertEqual(os.path.dirname(path), inst.directory)
+        self.assertTrue(path.endswith('.js'))
+        parts = []
+        for spec in (resources[0], resources[3]):
+            with open(resource_filename('deform', spec[7:]), 'rb') as f:
+                parts.append(f.read())
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), b';\n'.join(parts))
+        self.assertTrue(inst.bundle(resources, 'js') is result)
+
+    def test_bundle_single_resource(self):
+        inst = self._makeOne()
+        resources = ['deform:static/scripts/deform.js']
+        self.assertEqual(inst.bundle(resources, 'js'), tuple(resources))
+        self.assertEqual(os.listdir(inst.directory), [])
+
+    def test_rewrite_css(self):
+        inst = self._makeOne()
+        data = (b'a { background: url("../img/a.png"); }\n'
+                b'b { background: url(/abs.png); }\n'
+                b'c { background: url(data:image/gif;base64,R0l); }\n'
+                b'd { background: url( b.png ); }')
+        result = inst.rewrite_css(data, 'css/sub/form.css')
+        self.assertEqual(
+            result,
+            b'a { background: url(../static-deform/css/img/a.png); }\n'
+            b'b { background: url(/abs.png); }\n'
+            b'c { background: url(data:image/gif;base64,R0l); }\n'
+            b'd { background: url(../static-deform/css/sub/b.png); }')
+
+    def test_bundle_precompressed(self):
+        import gzip
+        inst = self._makeOne()
+        inst.encodings = ('gzip',)
+        resources = ['deform:static/scripts/deform.js',
+                     'deform:static/scripts/jquery.form-3.09.js']
+        path = inst.bundle(resources, 'js')[0]
+        with open(path, 'rb') as f:
+            expected = f.read()
+        with gzip.open(path + '.gz', 'rb') as f:
+            self.assertEqual(f.read(), expected)
+
+class Test_precompress_static(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.source = os.path.join(self.tempdir, 'source')
+        os.makedirs(os.path.join(self.source, 'scripts'))
+        with open(os.path.join(self.source, 'scripts', 'a.js'), 'wb') as f:
+            f.write(b'var a = 1;\n' * 100)
+        with open(os.path.join(self.source, 'tiny.css'), 'wb') as f:
+            f.write(b'a{}')
+        with open(os.path.join(self.source, 'img.png'), 'wb') as f:
+            f.write(b'\x89PNG' * 100)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def _callFUT(self, directory):
+        from pyramid_deform import precompress_static
+        return precompress_static(self.source, directory, ('gzip',))
+
+    def test_it(self):
+        import gzip
+        target = os.path.join(self.tempdir, 'target')
+        self.assertEqual(self._callFUT(target), ('gzip',))
+        self.assertEqual(sorted(os.listdir(target)),
+                         ['img.png', 'scripts', 'tiny.css'])
+        self.assertEqual(sorted(os.listdir(os.path.join(target, 'scripts'))),
+                         ['a.js', 'a.js.gz'])
+        with gzip.open(os.path.join(target, 'scripts', 'a.js.gz')) as f:
+            self.assertEqual(f.read(), b'var a = 1;\n' * 100)
+
+    def test_up_to_date_files_untouched(self):
+        target = os.path.join(self.tempdir, 'target')
+        self._callFUT(target)
+        compressed = os.path.join(target, 'scripts', 'a.js.gz')
+        os.utime(compressed, (1e10, 1e10))
+        self._callFUT(target)
+        self.assertEqual(os.path.getmtime(compressed), 1e10)
+
+class Test_bundle_form_views(unittest.TestCase):
+    def _callFUT(self, introspector, bundler):
+        from pyramid_deform import bundle_form_views
+        return bundle_form_views(introspector, bundler)
+
+    def test_it(self):
+        from pyramid_deform import FormView
+        class View(FormView):
+            schema = make_csrf_schema()
+        class Unbindable(FormView):
+            schema = object()
+        introspector = Mock()
+        introspector.get_category.return_value = [
+            {'introspectable': {'callable': View}},
+            {'introspectable': {'callable': Unbindable}},
+            {'introspectable': {'callable': FormView}},
+            {'introspectable': {'callable': lambda request: None}},
+            ]
+        bundler = Mock()
+        self._callFUT(introspector, bundler)
+        introspector.get_category.assert_called_with('views')
+        self.assertEqual(bundler.bundle.call_count, 2)
+
+class TestIncludeMeWarmTemplates(unittest.TestCase):
+    @patch('pyramid_deform.warm_templates')
+    @patch('pyramid_deform.configure_zpt_renderer')
+    def test_it(self, configure_zpt_renderer, warm_templates):
+        from pyramid_deform import includeme
+        config = Mock()
+        config.registry.settings = {}
+        includeme(config)
+        self.assertFalse(warm_templates.called)
+        config.registry.settings = {'pyramid_deform.warm_templates': 'true'}
+        includeme(config)
+        warm_templates.assert_called_with()
+
+class TestIncludeMeTranslationCache(unittest.TestCase):
+    @patch('pyramid_deform.configure_zpt_renderer')
+    def test_it(self, configure_zpt_renderer):
+        from pyramid_deform import includeme
+        from pyramid_deform import translation_cache
+        config = Mock()
+        config.registry.settings = {
+            'pyramid_deform.translation_cache_size': '2'}
+        try:
+            includeme(config)
+            self.assertEqual(translation_cache.maxsize, 2)
+        finally:
+            translation_cache.maxsize = 10000
+
+class TestTranslationCache(unittest.TestCase):
+    def test_bounded(self):
+        from pyramid_deform import TranslationCache
+        cache = TranslationCache(maxsize=2)
+        cache.set('a', 'A')
+        cache.set('b', 'B')
+        self.assertEqual(cache.get('a'), 'A')
+        cache.set('c', 'C')
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        cache.clear()
+        self.assertEqual((cache.hits, cache.misses), (0, 0))
+
+class Test_check_form_views(unittest.TestCase):
+    def _callFUT(self, introspector):
+        from pyramid_deform import check_form_views
+        return check_form_views(introspector)
+
+    def _makeIntrospector(self, *views):
+        introspector = Mock()
+        introspector.get_category.return_value = [
+            {'introspectable': {'callable': view}} for view in views]
+        return introspector
+
+    def test_ok(self):
+        from deform.form import Button
+        from pyramid_deform import FormView
+        class View(FormView):
+            buttons = ('save', Button('cancel'))
+            def save_success(self, appstruct): pass
+            def cancel_success(self, appstruct): pass
+        self._callFUT(self._makeIntrospector(
+            View, FormView, lambda request: None))
+
+    def test_missing_success(self):
+        from pyramid.exceptions import ConfigurationError
+        from pyramid_deform import FormView
+        class View(FormView):
+            buttons = ('save', 'cancel')
+            def save_success(self, appstruct): pass
+        self.assertRaises(ConfigurationError, self._callFUT,
+                          self._makeIntrospector(View))
+
 class TestIncludeMe(unittest.TestCase):
     @patch('pyramid_deform.configure_zpt_renderer')
     @patch('deform.form.Form')
@@ -764,6 +3007,201 @@ class TestIncludeMe(unittest.TestCase):
         config.add_static_view.assert_called_with('http://some.domain.com/override/path', 'deform:static')
         configure_zpt_renderer.assert_called_with([])
 
+    def _makeButtonsApp(self, settings):
+        from pyramid.config import Configurator
+        from pyramid_deform import FormView
+        class View(FormView):
+            buttons = ('save',)
+            def __init__(self, request):
+                FormView.__init__(self, request)
+                self.save_success = lambda appstruct: None
+        config = Configurator(settings=settings)
+        config.include('pyramid_deform')
+        config.add_view(View, name='edit')
+        return config.make_wsgi_app()
+
+    def test_check_buttons_default(self):
+        # buttons handled per instance are allowed
+        self._makeButtonsApp({})
+
+    def test_check_buttons(self):
+        self.assertRaises(ConfigurationError, self._makeButtonsApp,
+                          {'pyramid_deform.check_buttons': 'true'})
+
+    @patch('pyramid_deform.configure_zpt_renderer')
+    @patch('deform.form.Form')
+    def test_tempstore_reaper(self, Form, configure_zpt_renderer):
+        from pyramid_deform import includeme
+        from pyramid_deform import TempstoreReaper
+        config = Mock()
+        config.registry.settings = {
+            'pyramid_deform.tempdir': '/tmp/x',
+            'pyramid_deform.tempstore_max_bytes': '1000',
+            }
+        includeme(config)
+        reaper = config.registry.pyramid_deform_tempstore_reaper
+        self.assertTrue(isinstance(reaper, TempstoreReaper))
+        self.assertEqual(reaper.max_bytes, 1000)
+
+    @patch('pyramid_deform.configure_zpt_renderer')
+    @patch('deform.form.Form')
+    def test_bundle_dir(self, Form, configure_zpt_renderer):
+        from pyramid_deform import includeme
+        from pyramid_deform import AssetBundler
+        tempdir = tempfile.mkdtemp()
+        try:
+            config = Mock()
+            config.registry.settings = {
+                'pyramid_deform.bundle_dir': tempdir,
+                'pyramid_deform.bundle_path': 'assets/bundles',
+                }
+            includeme(config)
+        finally:
+            shutil.rmtree(tempdir)
+        config.add_static_view.assert_called_with(
+            'assets/bundles', tempdir, cache_max_age=31536000)
+        bundler = config.registry.pyramid_deform_bundler
+        self.assertTrue(isinstance(bundler, AssetBundler))
+        self.assertEqual(bundler.static_prefix, '../../static-deform/')
+        self.assertEqual(config.action.call_count, 1)
+
+    def test_bundle_dir_integration(self):
+        from pyramid.config import Configurator
+        from pyramid.request import Request
+        tempdir = tempfile.mkdtemp()
+        cwd = os.getcwd()
+        os.chdir(tempdir)
+        try:
+            config = Configurator(settings={
+                'pyramid_deform.bundle_dir': 'bundles'})
+            config.include('pyramid_deform')
+            app = config.make_wsgi_app()
+            os.chdir(cwd)
+            bundler = app.registry.pyramid_deform_bundler
+            links = bundler.bundle(['deform:static/scripts/deform.js',
+                                    'deform:static/scripts/jquery.form.js'],
+                                   'js')
+            self.assertEqual(os.path.dirname(links[0]),
+                             os.path.join(tempdir, 'bundles'))
+            request = Request.blank('/')
+            request.registry = app.registry
+            url = request.static_url(links[0])
+            self.assertTrue(url.startswith(
+                'http://localhost/static-deform-bundles/'))
+            response = Request.blank(url).get_response(app)
+            self.assertEqual(response.status_int, 200)
+            with open(links[0], 'rb') as f:
+                self.assertEqual(response.body, f.read())
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(tempdir)
+
+    @patch('pyramid_deform.precompress_static')
+    @patch('pyramid_deform.configure_zpt_renderer')
+    @patch('deform.form.Form')
+    def test_precompress(self, Form, configure_zpt_renderer,
+                         precompress_static):
+        from pyramid_deform import includeme
+        from pkg_resources import resource_filename
+        precompress_static.return_value = ('gzip',)
+        config = Mock()
+        config.registry.settings = {
+            'pyramid_deform.precompress': 'true',
+            'pyramid_deform.precompress_dir': '/cache ',
+            'pyramid_deform.bundle_dir': '/bundles',
+            }
+        with patch('pyramid_deform.AssetBundler') as AssetBundler:
+            includeme(config)
+        precompress_static.assert_called_with(
+            resource_filename('deform', 'static'), '/cache')
+        self.assertEqual(config.add_static_view.call_args_list[0],
+                         (('static-deform', 'deform:static'),
+                          {'content_encodings': ('gzip',)}))
+        config.override_asset.assert_called_with('deform:static/',
+                                                 '/cache' + os.sep)
+        config.add_static_view.assert_called_with(
+            'static-deform-bundles', '/bundles', cache_max_age=31536000,
+            content_encodings=('gzip',))
+        self.assertEqual(AssetBundler.return_value.encodings, ('gzip',))
+
+    def test_precompress_integration(self):
+        from pyramid.config import Configurator
+        from pyramid.request import Request
+        tempdir = tempfile.mkdtemp()
+        cwd = os.getcwd()
+        os.chdir(tempdir)
+        try:
+            with patch('pyramid_deform.assets.available_encodings',
+                       return_value=('gzip',)):
+                config = Configurator(settings={
+                    'pyramid_deform.precompress': 'true',
+                    'pyramid_deform.precompress_dir': 'precompressed',
+                    })
+                config.include('pyramid_deform')
+                app = config.make_wsgi_app()
+            os.chdir(cwd)
+            request = Request.blank('/')
+            request.registry = app.registry
+            url = request.static_url('deform:static/scripts/deform.js')
+            self.assertEqual(
+                url, 'http://localhost/static-deform/scripts/deform.js')
+            request = Request.blank(url)
+            request.accept_encoding = 'gzip'
+            response = request.get_response(app)
+            self.assertEqual(response.status_int, 200)
+            self.assertEqual(response.content_encoding, 'gzip')
+            response.decode_content()
+            with open(os.path.join(tempdir, 'precompressed', 'scripts',
+                                   'deform.js'), 'rb') as f:
+                self.assertEqual(response.body, f.read())
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(tempdir)
+
+    @patch('pyramid_deform.configure_zpt_renderer')
+    @patch('deform.form.Form')
+    def test_precompress_no_dir(self, Form, configure_zpt_renderer):
+        from pyramid_deform import includeme
+        config = Mock()
+        config.registry.settings = {'pyramid_deform.precompress': 'true'}
+        self.assertRaises(ConfigurationError, includeme, config)
+
+    @patch('pyramid_deform.configure_zpt_renderer')
+    @patch('deform.form.Form')
+    def test_wizard_state_store(self, Form, configure_zpt_renderer):
+        from pyramid_deform import includeme
+        from pyramid_deform import FileWizardStateStore
+        from pyramid_deform import MemoryWizardStateStore
+        tempdir = tempfile.mkdtemp()
+        try:
+            config = Mock()
+            config.registry.settings = {
+                'pyramid_deform.wizard_state_store': 'memory',
+                'pyramid_deform.wizard_state_ttl': '60',
+                }
+            includeme(config)
+            store = config.registry.pyramid_deform_wizard_store
+            self.assertTrue(isinstance(store, MemoryWizardStateStore))
+            self.assertEqual(store.ttl, 60)
+            config.registry.settings = {
+                'pyramid_deform.wizard_state_store': 'file',
+                'pyramid_deform.wizard_state_dir': tempdir,
+                }
+            includeme(config)
+            store = config.registry.pyramid_deform_wizard_store
+            self.assertTrue(isinstance(store, FileWizardStateStore))
+            config.registry.settings = {
+                'pyramid_deform.wizard_state_store': 'file'}
+            self.assertRaises(ConfigurationError, includeme, config)
+            config.registry.settings = {
+                'pyramid_deform.wizard_state_store': 'my.store'}
+            includeme(config)
+            config.maybe_dotted.assert_called_with('my.store')
+            config.maybe_dotted.return_value.assert_called_with(
+                config.registry.settings)
+        finally:
+            shutil.rmtree(tempdir)
+
     @patch('pyramid_deform.configure_zpt_renderer')
     @patch('deform.form.Form')
     def test_template_search_path(self, Form, configure_zpt_renderer):
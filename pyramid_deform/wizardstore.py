@@ -0,0 +1,195 @@
+""" The stores :class:`pyramid_deform.WizardState` keeps wizard data in. """
+import binascii
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import cPickle as pickle
+except ImportError: # pragma: no cover
+    import pickle
+
+from zope.interface import Interface
+from zope.interface import implementer
+
+class IWizardStateStore(Interface):
+    """
+    Interface of the objects :class:`WizardState` keeps wizard data in.
+    """
+    def load(request, wizard_name):
+        """
+        Return the ``dict`` of data of the wizard named ``wizard_name`` for
+        the user making ``request`` (an empty ``dict`` if there is none).
+        """
+
+    def save(request, wizard_name, wizdata):
+        """
+        Store ``wizdata``, the data returned by :meth:`load`, again after
+        it was modified.  Empty data may be discarded.
+        """
+
+@implementer(IWizardStateStore)
+class SessionWizardStateStore(object):
+    """
+    Keeps wizard data in ``request.session['pyramid_deform.wizards']``.
+    This is the default store.  Loading never modifies the session: the
+    data of wizards that have none stored is only inserted when saved.
+    """
+    def load(self, request, wizard_name):
+        wizdatas = request.session.get('pyramid_deform.wizards')
+        if wizdatas is None or wizard_name not in wizdatas:
+            return {}
+        return wizdatas[wizard_name]
+
+    def save(self, request, wizard_name, wizdata):
+        session = request.session
+        wizdatas = session.get('pyramid_deform.wizards')
+        if wizdata:
+            if wizdatas is None:
+                wizdatas = session['pyramid_deform.wizards'] = {}
+            wizdatas[wizard_name] = wizdata
+        elif wizdatas is not None and wizard_name in wizdatas:
+            del wizdatas[wizard_name]
+        else:
+            return
+        session.changed()
+
+def wizard_token(request, create=False):
+    """
+    Return the token identifying the user's wizard data in a server-side
+    :class:`IWizardStateStore`, which is the only thing such stores keep in
+    the session.  Returns ``None`` if there is none unless ``create`` is
+    true.
+    """
+    session = request.session
+    token = session.get('pyramid_deform.wizard_token')
+    if token is None and create:
+        token = binascii.hexlify(os.urandom(16)).decode('ascii')
+        session['pyramid_deform.wizard_token'] = token
+        session.changed()
+    return token
+
+@implementer(IWizardStateStore)
+class MemoryWizardStateStore(object):
+    """
+    Keeps wizard data in process memory for ``ttl`` seconds after it was
+    last used, evicting the least recently used data when more than
+    ``maxsize`` wizards are in progress.  Only usable with a single process.
+    """
+    def __init__(self, maxsize=10000, ttl=3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def load(self, request, wizard_name):
+        token = wizard_token(request)
+        if token is None:
+            return {}
+        key = (token, wizard_name)
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is None or entry[0] < time.time():
+                return {}
+            self.entries[key] = (time.time() + self.ttl, entry[1])
+            return entry[1]
+
+    def save(self, request, wizard_name, wizdata):
+        token = wizard_token(request, create=bool(wizdata))
+        if token is None:
+            return
+        key = (token, wizard_name)
+        with self.lock:
+            self.entries.pop(key, None)
+            if wizdata:
+                self.entries[key] = (time.time() + self.ttl, wizdata)
+                while len(self.entries) > self.maxsize:
+                    self.entries.popitem(last=False)
+
+# the names of the files written by FileWizardStateStore
+_wizard_state_file = re.compile(r'^[0-9a-f]{40}(\.[0-9a-f]{8})?$')
+
+@implementer(IWizardStateStore)
+class FileWizardStateStore(object):
+    """
+    Keeps wizard data in pickle files in ``directory``, each of which
+    expires ``ttl`` seconds after it was last written.  Expired files are
+    removed when they are next read, and by :meth:`reap`, which
+    :meth:`save` calls at most every ``reap_interval`` seconds.
+    """
+    def __init__(self, directory, ttl=3600, reap_interval=600):
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.directory = directory
+        self.ttl = ttl
+        self.reap_interval = reap_interval
+        self._next_reap = time.time() + reap_interval
+
+    def path(self, token, wizard_name):
+        key = ('%s:%s' % (token, wizard_name)).encode('utf-8')
+        return os.path.join(self.directory, hashlib.sha1(key).hexdigest())
+
+    def load(self, request, wizard_name):
+        token = wizard_token(request)
+        if token is None:
+            return {}
+        path = self.path(token, wizard_name)
+        try:
+            with open(path, 'rb') as f:
+                if os.fstat(f.fileno()).st_mtime + self.ttl >= time.time():
+                    return pickle.load(f)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            return {}
+        self._remove(path)
+        return {}
+
+    def save(self, request, wizard_name, wizdata):
+        now = time.time()
+        if now >= self._next_reap:
+            self._next_reap = now + self.reap_interval
+            self.reap(now)
+        token = wizard_token(request, create=bool(wizdata))
+        if token is None:
+            return
+        path = self.path(token, wizard_name)
+        if not wizdata:
+            self._remove(path)
+            return
+        temp = '%s.%s' % (path, binascii.hexlify(os.urandom(4)).decode())
+        with open(temp, 'wb') as f:
+            pickle.dump(wizdata, f, pickle.HIGHEST_PROTOCOL)
+        os.rename(temp, path)
+
+    def reap(self, now=None):
+        """
+        Remove the files of the wizards which expired, even if they are
+        never read again, and the temporary files of writes which did not
+        complete.  Files not named like those of the store are left alone.
+        Returns the number of files removed.
+        """
+        if now is None:
+            now = time.time()
+        removed = 0
+        for name in os.listdir(self.directory):
+            if _wizard_state_file.match(name) is None:
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                expired = os.path.getmtime(path) + self.ttl < now
+            except OSError:
+                continue
+            if expired:
+                self._remove(path)
+                removed += 1
+        return removed
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+_session_store = SessionWizardStateStore()
@@ -29,12 +29,13 @@ except IOError:
 
 install_requires = [
     'pyramid',
-    'deform>=0.8.1' # button disabled arg
+    'deform>=0.8.1', # button disabled arg
+    'zope.interface',
     ]
 
 tests_require = ['nose', 'coverage', 'Mock']
 
-docs_extras = ['Sphinx']
+docs_extras = ['Sphinx', 'repoze.sphinx.autointerface']
 
 setup(name='pyramid_deform',
       version=__version__,
@@ -67,5 +68,7 @@ setup(name='pyramid_deform',
           'docs':docs_extras,
           },
       entry_points = """\
+      [console_scripts]
+      reap_deform_tempstore = pyramid_deform.tempstore:reap_tempstore
       """,
       )